@@ -0,0 +1,134 @@
+# benchmarks/fixtures.py
+"""
+Deterministic synthetic inputs for the hot-path benchmarks.
+
+Everything is generated from fixed seeds, so two runs on the same machine
+measure exactly the same work: photos at several resolutions, session
+histories of a given length, and stand-ins for the network/model
+dependencies of the chat path (OpenAI client, sentence encoder).
+"""
+import os
+import hashlib
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+SEED = 1234
+# (name, width, height): thumbnail, typical web upload, 12 MP phone photo
+RESOLUTIONS = [
+    ("small", 320, 240),
+    ("medium", 1280, 960),
+    ("large", 4032, 3024),
+]
+SESSION_TURNS = (10, 100, 1000)
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+
+_QUESTIONS = [
+    "How often should I bathe my {breed}?",
+    "Is it normal for a {breed} to shed this much?",
+    "What vaccines does a {breed} puppy need?",
+    "My {breed} is scratching its ears, what should I do?",
+    "How much exercise does a {breed} need every day?",
+]
+_BREEDS = ["beagle", "labrador", "pug", "husky", "poodle", "corgi", "boxer", "collie"]
+
+
+def synthetic_image(width: int, height: int, seed: int = SEED) -> np.ndarray:
+    """BGR photo-like image: smooth gradients plus texture, so JPEG and blur metrics behave realistically."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    img = np.empty((height, width, 3), dtype=np.float32)
+    for ch in range(3):
+        fx, fy, phase = rng.uniform(1, 4), rng.uniform(1, 4), rng.uniform(0, np.pi)
+        img[..., ch] = 128 + 90 * np.sin(2 * np.pi * (fx * xx / width + fy * yy / height) + phase)
+    img += rng.normal(0, 12, size=(height, width, 1)).astype(np.float32)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def write_images(out_dir: str) -> Dict[str, str]:
+    """One JPEG per resolution in `out_dir`; returns {name: path}."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for i, (name, w, h) in enumerate(RESOLUTIONS):
+        path = os.path.join(out_dir, f"{name}_{w}x{h}.jpg")
+        cv2.imwrite(path, synthetic_image(w, h, SEED + i), [cv2.IMWRITE_JPEG_QUALITY, 90])
+        paths[name] = path
+    return paths
+
+
+def question(i: int) -> str:
+    return _QUESTIONS[i % len(_QUESTIONS)].format(breed=_BREEDS[(i // len(_QUESTIONS)) % len(_BREEDS)])
+
+
+def chat_turns(n: int) -> List[Tuple[str, str]]:
+    """`n` (role, text) turns alternating user/bot, with answers of realistic length."""
+    turns = []
+    for i in range(n):
+        if i % 2 == 0:
+            turns.append(("user", f"{question(i // 2)} (#{i // 2})"))
+        else:
+            turns.append(("bot", "Here is some general guidance for your dog. " * 8 + f"(#{i // 2})"))
+    return turns
+
+
+def image_analysis(i: int) -> Dict[str, Any]:
+    return {
+        "breed": _BREEDS[i % len(_BREEDS)],
+        "breed_confidence": 0.87,
+        "brightness": 0.61,
+        "clarity": 0.74,
+        "color_balance": 0.9,
+        "summary": "Overall photo quality is adequate for a quick visual check.",
+        "nutrition_tips": ["Keep treats under 10% of daily calories.", "Ensure fresh water at all times."],
+    }
+
+
+def session_data(turns: int, image_paths: List[str]) -> Dict[str, Any]:
+    """A session as SessionStore.get_history() returns it."""
+    return {
+        "created_at": "2025-01-01T00:00:00Z",
+        "chat_history": [{"role": "assistant" if r == "bot" else r, "text": t} for r, t in chat_turns(turns)],
+        "image_history": [
+            {"filename": os.path.basename(p), "image_path": p, "analysis": image_analysis(i)}
+            for i, p in enumerate(image_paths)
+        ],
+    }
+
+
+def faq_entries(n: int) -> Dict[str, str]:
+    return {f"{question(i)} [{i}]": f"FAQ answer {i}. " * 10 for i in range(n)}
+
+
+class StubEncoder:
+    """
+    Stands in for the SentenceTransformer: a unit vector derived from a
+    hash of the text. Identical texts get identical vectors, different
+    texts are nearly orthogonal, and nothing is downloaded.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _vector(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+        v = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return v / np.linalg.norm(v)
+
+    def encode(self, texts, normalize_embeddings: bool = True, batch_size: int = 64, **_) -> np.ndarray:
+        return np.stack([self._vector(t) for t in texts])
+
+
+class StubLLMClient:
+    """Minimal OpenAI client: `chat.completions.create()` returns a canned answer immediately."""
+
+    def __init__(self, answer: str = "A stubbed veterinary answer. " * 10):
+        self.calls = 0
+        response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))])
+
+        def create(**kwargs):
+            self.calls += 1
+            return response
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
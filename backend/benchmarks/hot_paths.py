@@ -0,0 +1,399 @@
+# benchmarks/hot_paths.py
+"""
+Micro-benchmarks for the request hot paths.
+
+Each case runs a warmup, then times individual calls to report latency
+percentiles and throughput; a few extra calls under tracemalloc give the
+peak Python/numpy allocation per call (torch's own allocator is not
+traced). Inputs come from benchmarks/fixtures.py, the LLM client and the
+sentence encoder are stubbed, and all files go to a temp directory, so the
+suite runs offline and never touches data/. Cases whose dependencies are
+missing (e.g. torch) are reported as skipped. Without cached pretrained
+weights the vision cases fall back to a randomly initialised backbone,
+which has the same cost.
+
+    python -m benchmarks.hot_paths run --out benchmarks/results/main.json
+    python -m benchmarks.hot_paths run --only session_store storage --baseline benchmarks/results/main.json
+    python -m benchmarks.hot_paths compare benchmarks/results/main.json benchmarks/results/new.json --threshold 0.1
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import itertools
+import subprocess
+import tracemalloc
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Model hubs must never be contacted from a benchmark run
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import numpy as np  # noqa: E402
+
+from benchmarks import fixtures  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# Fewer samples than this are never reported, whatever the time budget
+MIN_SAMPLES = 5
+# metric -> True when larger is better
+METRICS = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "mean_ms": False,
+    "throughput_per_s": True,
+    "peak_mem_kib": False,
+}
+
+# A group yields (case name, factory); the factory does the case's setup and returns the call to time
+Case = Tuple[str, Callable[[], Callable[[], Any]]]
+
+
+class Skip(Exception):
+    """The group can't run in this environment."""
+
+
+# ----------------- measurement -----------------
+def measure(fn: Callable[[], Any], iterations: int, warmup: int, max_seconds: float,
+            memory_iterations: int) -> Dict[str, Any]:
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    deadline = time.perf_counter() + max_seconds
+    while len(samples) < iterations:
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+        if started > deadline and len(samples) >= MIN_SAMPLES:
+            break
+
+    peak = None
+    if memory_iterations > 0:
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            for _ in range(memory_iterations):
+                fn()
+            peak = tracemalloc.get_traced_memory()[1] - base
+        finally:
+            tracemalloc.stop()
+
+    ms = np.array(samples) * 1000
+    return {
+        "iterations": len(samples),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "min_ms": round(float(ms.min()), 4),
+        "max_ms": round(float(ms.max()), 4),
+        "throughput_per_s": round(len(samples) / float(np.sum(samples)), 2),
+        "peak_mem_kib": round(peak / 1024, 1) if peak is not None else None,
+    }
+
+
+# ----------------- cases -----------------
+def _require(module: str):
+    try:
+        return __import__(module, fromlist=["_"])
+    except ImportError as e:
+        raise Skip(f"{e.name or module} is not installed")
+
+
+@lru_cache(maxsize=1)
+def _vision_weights() -> str:
+    """Load the production model, or install a random-init backbone when weights aren't cached."""
+    from services import dog_vision
+    from services.model_registry import registry
+
+    try:
+        dog_vision._load_model()
+        return "pretrained"
+    except Exception:
+        builder, _ = dog_vision.BACKBONES[dog_vision.BACKBONE]
+        registry.override("dog_vision", builder(weights=None).eval())
+        return "random-init"
+
+
+def vision_cases(ws: Dict[str, Any]) -> Iterator[Case]:
+    _require("torch")
+    from PIL import Image
+    from services.breed_classifier import predict_breed
+    from services.dog_detector import is_dog_image
+
+    for name, path in ws["images"].items():
+        for label, fn in (("predict_breed", predict_breed), ("is_dog_image", is_dog_image)):
+            def factory(path=path, fn=fn):
+                _vision_weights()
+                img = Image.open(path).convert("RGB")
+                return lambda: fn(img)
+
+            yield f"vision.{label}[{name}]", factory
+
+
+def image_cases(ws: Dict[str, Any]) -> Iterator[Case]:
+    from services.image_service import analyze_image
+
+    for name, path in ws["images"].items():
+        yield f"image.analyze_image[{name}]", lambda path=path: (lambda: analyze_image(path))
+
+
+def chat_cases(ws: Dict[str, Any]) -> Iterator[Case]:
+    _require("openai")
+    import atexit
+    from services import chat_service
+    from services.faq_index import FaqIndex
+    from services.model_registry import registry
+    from services.semantic_cache import SemanticCache
+
+    # Overrides go in after the import, which registers the real loaders
+    llm = fixtures.StubLLMClient()
+    registry.override("sentence_encoder", fixtures.StubEncoder())
+    registry.override("openai_client", llm)
+    faq_entries = fixtures.faq_entries(1000)
+    faq = FaqIndex(encode_batch=chat_service._encode_questions, path=None)
+    faq.add(faq_entries)
+    registry.override("faq_index", faq)
+    cache = SemanticCache(encode=chat_service._encode_question,
+                          path=os.path.join(ws["tmp"], "semantic_cache.npz"), save_interval=3600)
+    atexit.unregister(cache.save)
+    chat_service.semantic_cache = cache
+
+    faq_question = next(iter(faq_entries))
+    counter = itertools.count()
+
+    yield "chat.answer_question[nutrition]", lambda: (
+        lambda: chat_service.answer_question("What diet does my 3 year old 12kg beagle need?"))
+    yield "chat.answer_question[faq]", lambda: (lambda: chat_service.answer_question(faq_question))
+    # Same question every call: answered by the semantic cache after the warmup
+    yield "chat.answer_question[llm_cached]", lambda: (
+        lambda: chat_service.answer_question("Why does my dog sneeze after walks in the park?"))
+    # A new question every call: cache miss, stub LLM round trip, cache store
+    yield "chat.answer_question[llm]", lambda: (
+        lambda: chat_service.answer_question(f"Why does my dog sneeze after walks, case {next(counter)}?"))
+
+
+def session_store_cases(ws: Dict[str, Any]) -> Iterator[Case]:
+    from services.session_store import SessionStore
+
+    for persistence in ("journal", "snapshot"):
+        for turns in fixtures.SESSION_TURNS:
+            def factory(persistence=persistence, turns=turns):
+                store = SessionStore(persistence=persistence,
+                                     sessions_dir=os.path.join(ws["tmp"], f"sessions-{persistence}-{turns}"))
+                sid = store.create_session()
+                for role, text in fixtures.chat_turns(turns):
+                    store.add_chat(sid, role, text)
+                return lambda: store.add_chat(sid, "user", "How much should my dog eat?")
+
+            yield f"session_store.add_chat[{persistence},turns={turns}]", factory
+
+
+def storage_cases(ws: Dict[str, Any]) -> Iterator[Case]:
+    from services import storage
+
+    path = ws["images"]["medium"]
+
+    def sqlite_factory():
+        storage._storage = storage.SqliteStorage(os.path.join(ws["tmp"], "registry.db"), auto_import=False)
+        return lambda: storage.register_image("bench.jpg", path)
+
+    def json_factory():
+        files = {}
+        for name in ("HISTORY_FILE", "IMAGES_FILE", "REPORTS_FILE"):
+            files[name] = os.path.join(ws["tmp"], name.lower().replace("_file", ".json"))
+            with open(files[name], "w", encoding="utf-8") as fp:
+                json.dump([], fp)
+        ws["patches"].append(mock.patch.multiple(storage, **files))
+        ws["patches"][-1].start()
+        storage._storage = storage.JsonStorage()
+        return lambda: storage.register_image("bench.jpg", path)
+
+    saved = storage._storage
+    try:
+        yield "storage.register_image[sqlite]", sqlite_factory
+        yield "storage.register_image[json]", json_factory
+    finally:
+        storage._storage = saved
+
+
+def report_cases(ws: Dict[str, Any]) -> Iterator[Case]:
+    _require("reportlab")
+    from services import report_service
+
+    out = os.path.join(ws["tmp"], "reports")
+    os.makedirs(out, exist_ok=True)
+    ws["patches"].append(mock.patch.multiple(
+        report_service,
+        REPORT_DIR=out,
+        REPORT_META_DIR=os.path.join(out, "meta"),
+        REPORT_IMAGE_DIR=os.path.join(out, "images"),
+    ))
+    ws["patches"][-1].start()
+    images = [ws["images"]["medium"], ws["images"]["large"]]
+
+    for turns in fixtures.SESSION_TURNS:
+        def factory(turns=turns):
+            data = fixtures.session_data(turns, images)
+            return lambda: report_service.create_session_report_pdf(f"bench-{turns}", data)
+
+        yield f"report.create_session_report_pdf[turns={turns}]", factory
+
+
+GROUPS = {
+    "vision": vision_cases,
+    "image": image_cases,
+    "chat": chat_cases,
+    "session_store": session_store_cases,
+    "storage": storage_cases,
+    "report": report_cases,
+}
+
+
+# ----------------- run / compare -----------------
+def _meta(args) -> Dict[str, Any]:
+    meta = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "iterations": args.iterations,
+        "warmup": args.warmup,
+        "max_seconds": args.max_seconds,
+    }
+    try:
+        import torch
+        meta["torch"] = torch.__version__
+        meta["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        meta["torch"] = None
+    try:
+        meta["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except Exception:
+        meta["git_commit"] = None
+    return meta
+
+
+def _wanted(name: str, only: Optional[List[str]]) -> bool:
+    return not only or any(term in name for term in only)
+
+
+def run(args) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    skipped: Dict[str, str] = {}
+    tmp = tempfile.mkdtemp(prefix="hot-paths-")
+    ws = {"tmp": tmp, "images": fixtures.write_images(os.path.join(tmp, "images")), "patches": []}
+    try:
+        for group, cases in GROUPS.items():
+            if args.only and not any(t in group or group in t for t in args.only):
+                continue
+            try:
+                for name, factory in cases(ws):
+                    if not _wanted(name, args.only):
+                        continue
+                    res = measure(factory(), args.iterations, args.warmup, args.max_seconds,
+                                  args.memory_iterations)
+                    if group == "vision":
+                        res["weights"] = _vision_weights()
+                    results[name] = res
+                    print(f"{name:50s} p50 {res['p50_ms']:10.3f} ms  p95 {res['p95_ms']:10.3f} ms  "
+                          f"{res['throughput_per_s']:10.1f}/s  peak {res['peak_mem_kib']} KiB", flush=True)
+            except Skip as e:
+                skipped[group] = str(e)
+                print(f"{group + '.*':50s} skipped: {e}", flush=True)
+    finally:
+        for patch in reversed(ws["patches"]):
+            patch.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return {"meta": _meta(args), "results": results, "skipped": skipped}
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], metric: str,
+            threshold: float) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Per-case relative change of `metric`; a case regresses when it is worse by more than `threshold`."""
+    higher_is_better = METRICS[metric]
+    rows, regressions = [], []
+    for name in sorted(set(base["results"]) | set(new["results"])):
+        old, cur = base["results"].get(name), new["results"].get(name)
+        if old is None or cur is None or old.get(metric) in (None, 0) or cur.get(metric) is None:
+            rows.append({"case": name, "base": old and old.get(metric), "new": cur and cur.get(metric),
+                         "change": None, "regression": False})
+            continue
+        change = cur[metric] / old[metric] - 1
+        worse = -change if higher_is_better else change
+        regressed = worse > threshold
+        if regressed:
+            regressions.append(name)
+        rows.append({"case": name, "base": old[metric], "new": cur[metric],
+                     "change": round(change, 4), "regression": regressed})
+    return rows, regressions
+
+
+def print_comparison(rows: List[Dict[str, Any]], metric: str) -> None:
+    print(f"{'case':50s} {'base ' + metric:>18s} {'new ' + metric:>18s} {'change':>9s}")
+    for r in rows:
+        fmt = lambda v: f"{v:18.3f}" if isinstance(v, (int, float)) else f"{'-':>18s}"  # noqa: E731
+        change = f"{r['change']:+8.1%}" if r["change"] is not None else f"{'-':>8s}"
+        print(f"{r['case']:50s} {fmt(r['base'])} {fmt(r['new'])} {change}{'  REGRESSION' if r['regression'] else ''}")
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="run the benchmarks and save JSON results")
+    run_p.add_argument("--only", nargs="*", help="substrings of group or case names to run")
+    run_p.add_argument("--iterations", type=int, default=50, help="timed calls per case")
+    run_p.add_argument("--warmup", type=int, default=3)
+    run_p.add_argument("--max-seconds", type=float, default=5.0, help="time budget per case")
+    run_p.add_argument("--memory-iterations", type=int, default=3, help="calls traced for peak memory; 0 disables")
+    run_p.add_argument("--out", default=None, help="results file (default benchmarks/results/<timestamp>.json)")
+    run_p.add_argument("--baseline", default=None, help="compare against this results file afterwards")
+
+    compare_p = sub.add_parser("compare", help="compare two results files")
+    compare_p.add_argument("base")
+    compare_p.add_argument("new")
+    for p in (run_p, compare_p):
+        p.add_argument("--metric", choices=sorted(METRICS), default="p50_ms")
+        p.add_argument("--threshold", type=float, default=0.10, help="allowed relative slowdown, e.g. 0.1 = 10%%")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(args)
+        out = args.out or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        with open(out, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+        print(f"results written to {out}")
+        if not args.baseline:
+            return
+        base, new = _load(args.baseline), report
+    else:
+        base, new = _load(args.base), _load(args.new)
+
+    rows, regressions = compare(base, new, args.metric, args.threshold)
+    print_comparison(rows, args.metric)
+    if regressions:
+        print(f"{len(regressions)} case(s) regressed by more than {args.threshold:.0%} on {args.metric}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/session_store_stress.py
+"""
+Concurrency stress test for SessionStore.
+
+Many threads append chats to many sessions at once; afterwards every
+message must be present exactly once and in per-thread order, both in
+memory and on disk (snapshot files / journal replay). Snapshot mode is run
+with a single lock stripe (the old global-lock behaviour) and with the
+default stripe count to show the throughput difference.
+
+    python -m benchmarks.session_store_stress --threads 32 --sessions 64 --messages 50
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.session_store import SessionStore, SESSION_LOCK_STRIPES  # noqa: E402
+
+
+def _worker(store, session_ids, tid, messages, errors):
+    try:
+        for i in range(messages):
+            sid = session_ids[(tid + i) % len(session_ids)]
+            store.add_chat(sid, "user", f"t{tid}-m{i}")
+    except Exception as e:
+        errors.append(e)
+
+
+def _check(histories, threads, messages):
+    """Every message exactly once, each thread's messages in order within a session."""
+    seen = defaultdict(list)
+    for chats in histories.values():
+        last = {}
+        for c in chats:
+            tid, i = c["text"][1:].split("-m")
+            tid, i = int(tid), int(i)
+            if last.get(tid, -1) >= i:
+                return f"out of order: {c['text']}"
+            last[tid] = i
+            seen[tid].append(i)
+    for tid in range(threads):
+        if sorted(seen[tid]) != list(range(messages)):
+            return f"thread {tid}: {len(seen[tid])}/{messages} messages"
+    return None
+
+
+def run(persistence, stripes, threads, sessions, messages):
+    tmp = tempfile.mkdtemp(prefix="session-stress-")
+    try:
+        store = SessionStore(persistence=persistence, sessions_dir=tmp, lock_stripes=stripes)
+        ids = [store.create_session() for _ in range(sessions)]
+        errors = []
+        workers = [
+            threading.Thread(target=_worker, args=(store, ids, t, messages, errors))
+            for t in range(threads)
+        ]
+        start = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+        if errors:
+            return {"ok": False, "error": repr(errors[0])}
+
+        problem = _check({sid: store.get_history(sid)["chat_history"] for sid in ids}, threads, messages)
+        if problem is None:
+            # What a restarted process would see
+            for sid in ids:
+                store.end_session(sid)
+            on_disk = {}
+            for sid in ids:
+                with open(os.path.join(tmp, f"{sid}.json"), "r", encoding="utf-8") as fp:
+                    on_disk[sid] = json.load(fp)["chat_history"]
+            problem = _check(on_disk, threads, messages)
+        total = threads * messages
+        return {
+            "ok": problem is None,
+            "error": problem,
+            "messages": total,
+            "seconds": round(elapsed, 3),
+            "msgs_per_sec": round(total / elapsed, 1),
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--messages", type=int, default=50, help="messages per thread")
+    args = parser.parse_args()
+
+    cases = [
+        ("snapshot", 1),
+        ("snapshot", SESSION_LOCK_STRIPES),
+        ("journal", SESSION_LOCK_STRIPES),
+    ]
+    failed = False
+    for persistence, stripes in cases:
+        res = run(persistence, stripes, args.threads, args.sessions, args.messages)
+        failed |= not res["ok"]
+        print(f"{persistence:9s} stripes={stripes:<3d} {json.dumps(res)}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,51 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
+from typing import List
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-import os, io, json
-from PIL import Image
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+import os, json, time, asyncio
 
 from services.nutrient_service import calculate_nutrients
-from services.location_service import enrich_with_location
-from services.llm_service import generate_dynamic_answer
+from services.location_service import enrich_with_location, normalize_location
+from services.llm_service import generate_dynamic_answer, stream_dynamic_answer
+from services.enrichment import (
+    FanOut,
+    LLM_TIMEOUT_SECONDS,
+    NUTRIENT_TIMEOUT_SECONDS,
+    LOCATION_TIMEOUT_SECONDS,
+)
 
 
-from services.dog_detector import is_dog_image
-from services.breed_classifier import predict_breed
+from services.dog_vision import analyze_batch as dog_vision_batch, MODEL_TAG
+from services.inference_scheduler import MicroBatcher, QueueFullError, all_stats as inference_stats
+from services.analysis_cache import AnalysisCache
+from services.upload_service import spool_upload, UploadRejected, MAX_BATCH_IMAGES
 from services.session_store import SessionStore
-from models.schemas import ChatRequest, ChatAnswer, ImageAnalysis
+from services.model_registry import registry, WARMUP_ON_STARTUP
+from services.metrics import metrics, stage_timer, MetricsMiddleware, CONTENT_TYPE, REJECTIONS, STAGE_SECONDS
+from models.schemas import ChatRequest, ChatAnswer, ImageAnalysis, BatchImageResult, BatchImageAnalysis
 from services import chat_service
-from services.image_service import analyze_image
-from services.report_service import create_session_report_pdf
+from services.chat_service import semantic_cache
+from services.image_service import analyze_image_array, decode_image, ANALYSIS_VERSION
+from services.report_jobs import report_jobs
+from routes.reports import router as reports_router
+from routes.profiling import install_profiling
+from services.report_service import cached_report, session_fingerprint
 from services.storage import (
     ensure_dirs,
     UPLOAD_DIR,
     REPORT_DIR,
     register_image,
+    register_images,
 )
 
 app = FastAPI(title="Dog Health AI Backend", version="1.0.0")
 sessions = SessionStore()
 
+# Concurrent uploads share batched forward passes instead of running N batch-size-1 passes
+dog_vision_batcher = MicroBatcher("dog_vision", dog_vision_batch)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -34,18 +54,75 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Static folders
 ensure_dirs()
+analysis_cache = AnalysisCache(model_tag=f"{MODEL_TAG}-analysis{ANALYSIS_VERSION}")
+# Registry/download/export routes must be matched before the static /reports mount
+app.include_router(reports_router)
 app.mount("/reports", StaticFiles(directory=REPORT_DIR), name="reports")
 app.mount("/images", StaticFiles(directory=UPLOAD_DIR), name="images")
 
+# Gauges read at scrape time
+metrics.gauge("sessions_resident", "Sessions in the in-memory working set").set_function(
+    lambda: sessions.stats()["resident"]
+)
+metrics.gauge("report_jobs_active", "Sessions with a report queued or rendering").set_function(
+    lambda: report_jobs.stats()["active"]
+)
+# UploadRejected status -> rejection reason
+_UPLOAD_REJECT_REASONS = {400: "empty", 413: "too_large", 415: "unsupported_type"}
+
+
+@app.on_event("startup")
+def warm_models():
+    # Opt-in (MODEL_WARMUP=1): load and exercise every model off the request path
+    if WARMUP_ON_STARTUP:
+        registry.start_background_warmup()
+
+
+@app.on_event("shutdown")
+def stop_report_workers():
+    report_jobs.shutdown()
+
 
 @app.get("/")
 def root():
     return {"status": "ok", "message": "Dog Health AI API running"}
 
 
+@app.get("/ready")
+def ready():
+    """Readiness probe: per-model load state and warm-up time; 503 until warm."""
+    status = registry.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/inference/metrics")
+def inference_metrics():
+    """Batch size, queue wait and queue depth per inference scheduler, plus analysis cache stats."""
+    return {**inference_stats(), "analysis_cache": analysis_cache.stats()}
+
+
+@app.get("/chat/metrics")
+def chat_metrics():
+    """Semantic response cache hit rate and estimated LLM time saved."""
+    return {"semantic_cache": semantic_cache.stats()}
+
+
+@app.get("/session/metrics")
+def session_metrics():
+    """Session working-set size and hit/miss/eviction counts."""
+    return {"session_cache": sessions.stats()}
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Per-stage latency histograms, cache/error/rejection counters and gauges, Prometheus text format."""
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+
 # ----------------- SESSION MANAGEMENT -----------------
 @app.post("/session/start")
 def start_session(existing_session_id: str = None):
@@ -60,17 +137,55 @@ def start_session(existing_session_id: str = None):
 
 @app.get("/session/{session_id}/history")
 def get_session_history(session_id: str):
-    if not sessions.exists(session_id):
-        path = os.path.join(SessionStore.SESSIONS_DIR, f"{session_id}.json")
-        if not os.path.exists(path):
-            return []
-        with open(path, "r", encoding="utf-8") as f:
-            raw_data = json.load(f)
-            return raw_data.get("chat_history", [])
+    # Live, evicted and ended sessions all load through the store
     return sessions.get_history(session_id).get("chat_history", [])
 
 
 # ----------------- CHAT IN SESSION -----------------
+def _wants_nutrients(user_msg: str) -> bool:
+    return "nutrient" in user_msg.lower() or "diet" in user_msg.lower() or "calorie" in user_msg.lower()
+
+
+def _nutrient_appendix(user_msg: str) -> str:
+    nutrient_data = calculate_nutrients(user_msg)
+    return f"\n\n📊 Nutrient Analysis:\n{nutrient_data}"
+
+
+def _location_appendix(location, user_msg: str) -> str:
+    location_note = enrich_with_location(location, user_msg)
+    if location_note:
+        return f"\n\n🌍 Location-based advice:\n{location_note}"
+    return ""
+
+
+def _start_enrichers(fan: FanOut, user_msg: str, location) -> list:
+    """Kick off the optional appendices; returns their names in output order."""
+    names = []
+    if _wants_nutrients(user_msg):
+        fan.submit("nutrients", _nutrient_appendix, user_msg, timeout=NUTRIENT_TIMEOUT_SECONDS)
+        names.append("nutrients")
+    if location:
+        fan.submit("location", _location_appendix, location, user_msg, timeout=LOCATION_TIMEOUT_SECONDS)
+        names.append("location")
+    return names
+
+
+def _cache_lookup(user_msg: str, history: list, namespace: str):
+    # The semantic cache is an optimization; if it fails, answer as on a miss
+    try:
+        return semantic_cache.lookup(user_msg, history, namespace)
+    except Exception as e:
+        print("Semantic cache lookup failed:", e)
+        return None
+
+
+def _cache_store(user_msg: str, answer: str, history: list, namespace: str, latency_s=None) -> None:
+    try:
+        semantic_cache.store(user_msg, answer, history, namespace, latency_s=latency_s)
+    except Exception as e:
+        print("Semantic cache store failed:", e)
+
+
 @app.post("/session/{session_id}/chat", response_model=ChatAnswer)
 def chat_in_session(session_id: str, req: ChatRequest):
     """
@@ -84,112 +199,348 @@ def chat_in_session(session_id: str, req: ChatRequest):
         sessions.create_session_with_id(session_id)
 
     user_msg = req.question.strip()
-    location = getattr(req, "location", None)
+    location = req.location
     history = sessions.get_history(session_id).get("chat_history", [])
+    namespace = normalize_location(location) if location else ""
+
+    # --- 0. Semantic cache (skipped for context-dependent follow-ups) ---
+    with stage_timer("chat", "cache_lookup"):
+        cached_answer = _cache_lookup(user_msg, history, namespace)
+
+    # --- 1-3. LLM answer, nutrient calculation and location enrichment run concurrently ---
+    fan = FanOut(operation="chat")
+    if cached_answer is None:
+        fan.submit(
+            "llm", generate_dynamic_answer, user_msg, history, location, LLM_TIMEOUT_SECONDS,
+            timeout=LLM_TIMEOUT_SECONDS, required=True,
+        )
+    appendices = _start_enrichers(fan, user_msg, location)
+
+    if cached_answer is None:
+        try:
+            answer = fan.result("llm")
+        except TimeoutError:
+            raise HTTPException(status_code=504, detail="The assistant took too long to answer, please try again")
+        llm_ms = fan.metadata()["timings_ms"].get("llm")
+        _cache_store(user_msg, answer, history, namespace,
+                     latency_s=llm_ms / 1000.0 if llm_ms is not None else None)
+    else:
+        answer = cached_answer
 
-    # --- 1. Generate answer with LLM ---
-    answer = generate_dynamic_answer(user_msg, history, location)
-
-    # --- 2. Nutrient calculation if triggered ---
-    if "nutrient" in user_msg.lower() or "diet" in user_msg.lower() or "calorie" in user_msg.lower():
-        nutrient_data = calculate_nutrients(user_msg)
-        answer += f"\n\n📊 Nutrient Analysis:\n{nutrient_data}"
-
-    # --- 3. Location enrichment ---
-    if location:
-        location_note = enrich_with_location(location, user_msg)
-        if location_note:
-            answer += f"\n\n🌍 Location-based advice:\n{location_note}"
+    # Appendices that missed their budget are dropped and listed in metadata["degraded"]
+    for name in appendices:
+        answer += fan.result(name) or ""
 
     # --- 4. Save conversation ---
-    sessions.add_chat(session_id, "user", user_msg)
-    sessions.add_chat(session_id, "bot", answer)
+    with stage_timer("chat", "persist"):
+        sessions.add_chat(session_id, "user", user_msg)
+        sessions.add_chat(session_id, "bot", answer)
 
-    return ChatAnswer(answer=answer, matched_question=None, score=1.0)
+    metadata = fan.metadata()
+    metadata["semantic_cache"] = "hit" if cached_answer is not None else "miss"
+    return ChatAnswer(answer=answer, matched_question=None, score=1.0, metadata=metadata)
 
 
-# ----------------- IMAGE UPLOAD & ANALYSIS -----------------
-@app.post("/session/{session_id}/upload/analyze", response_model=ImageAnalysis)
-async def upload_and_analyze_in_session(session_id: str, file: UploadFile = File(...)):
-    if not sessions.exists(session_id):
-        sessions.create_session_with_id(session_id)
+def _sse(event: dict) -> str:
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
 
-    raw = await file.read()
-    try:
-        pil_img = Image.open(io.BytesIO(raw)).convert("RGB")
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid image file")
-
-    ok, label, conf = is_dog_image(pil_img, threshold=0.30)
-    if not ok:
-        raise HTTPException(
-            status_code=400,
-            detail=f"This looks like '{label}' ({conf:.2f}). Please upload a clear dog photo."
-        )
 
-    dst = os.path.join(UPLOAD_DIR, file.filename)
-    with open(dst, "wb") as f:
-        f.write(raw)
+@app.post("/session/{session_id}/chat/stream")
+async def chat_in_session_stream(session_id: str, req: ChatRequest):
+    """
+    Server-Sent Events variant of chat_in_session.
+    Events: {"type": "token"} per LLM delta, {"type": "appendix"} for the
+    nutrient / location notes, then {"type": "done"} with the full answer,
+    which is persisted to the session once the stream completes.
+    """
+    # Session store calls may hit the disk; keep them off the event loop
+    await run_in_threadpool(sessions.create_session_with_id, session_id)  # no-op for a live session
 
-    img_meta = register_image(file.filename, dst)
+    user_msg = req.question.strip()
+    location = req.location
+    history = list((await run_in_threadpool(sessions.get_history, session_id)).get("chat_history", []))
+    namespace = normalize_location(location) if location else ""
+    cached_answer = await run_in_threadpool(_cache_lookup, user_msg, history, namespace)
+
+    # Appendices are computed while the LLM streams
+    fan = FanOut(operation="chat_stream")
+    appendices = _start_enrichers(fan, user_msg, location)
+
+    async def events():
+        parts = []
+        try:
+            if cached_answer is not None:
+                parts.append(cached_answer)
+                yield _sse({"type": "token", "text": cached_answer})
+            else:
+                started = time.perf_counter()
+                async for delta in stream_dynamic_answer(user_msg, history, location, LLM_TIMEOUT_SECONDS):
+                    parts.append(delta)
+                    yield _sse({"type": "token", "text": delta})
+                STAGE_SECONDS.observe(time.perf_counter() - started, operation="chat_stream", stage="llm")
+                await run_in_threadpool(
+                    _cache_store, user_msg, "".join(parts), history, namespace,
+                    time.perf_counter() - started,
+                )
+
+            for kind in appendices:
+                appendix = await fan.result_async(kind)
+                if appendix:
+                    parts.append(appendix)
+                    yield _sse({"type": "appendix", "kind": kind, "text": appendix})
+        except Exception as e:
+            yield _sse({"type": "error", "detail": str(e)})
+            return
+
+        answer = "".join(parts)
+        with stage_timer("chat_stream", "persist"):
+            await run_in_threadpool(sessions.add_chat, session_id, "user", user_msg)
+            await run_in_threadpool(sessions.add_chat, session_id, "bot", answer)
+        metadata = fan.metadata()
+        metadata["semantic_cache"] = "hit" if cached_answer is not None else "miss"
+        yield _sse({"type": "done", "answer": answer, "metadata": metadata})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    brightness, clarity, color_balance, summary, nutrition = analyze_image(dst)
-    breed, breed_conf = predict_breed(pil_img)
 
-    analysis = {
-        "breed": breed,
-        "breed_confidence": round(breed_conf, 3),
+# ----------------- IMAGE UPLOAD & ANALYSIS -----------------
+def _build_analysis(vision, metrics) -> dict:
+    brightness, clarity, color_balance, summary, nutrition = metrics
+    return {
+        "breed": vision.breed,
+        "breed_confidence": round(vision.breed_confidence, 3),
         "brightness": round(brightness, 3),
         "clarity": round(clarity, 3),
         "color_balance": round(color_balance, 3),
         "summary": summary,
         "nutrition_tips": nutrition,
+        "top_breeds": [
+            {"breed": b, "confidence": round(c, 3)} for b, c in vision.top_breeds
+        ],
     }
 
-    sessions.add_image_analysis(session_id, file.filename, analysis)
-
-    return ImageAnalysis(
-        image_id=img_meta["id"],
-        breed=breed,
-        breed_confidence=round(breed_conf, 3),
-        brightness=round(brightness, 3),
-        clarity=round(clarity, 3),
-        color_balance=round(color_balance, 3),
-        summary=summary,
-        nutrition_tips=nutrition,
-    )
+
+def _not_a_dog(vision) -> str:
+    return f"This looks like '{vision.label}' ({vision.confidence:.2f}). Please upload a clear dog photo."
+
+
+@app.post("/session/{session_id}/upload/analyze", response_model=ImageAnalysis)
+async def upload_and_analyze_in_session(session_id: str, file: UploadFile = File(...)):
+    await run_in_threadpool(sessions.create_session_with_id, session_id)  # no-op for a live session
+
+    # Streamed to a temp file in chunks: size limit, magic bytes and hash checked on the way
+    try:
+        with stage_timer("upload", "spool"):
+            upload = await spool_upload(file)
+    except UploadRejected as e:
+        REJECTIONS.inc(operation="upload", reason=_UPLOAD_REJECT_REASONS.get(e.status_code, "invalid"))
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    digest = upload.digest
+
+    try:
+        # Re-uploads of the same photo skip decoding and inference entirely
+        analysis = await run_in_threadpool(analysis_cache.get, digest)
+        if analysis is None:
+            # Decode once; the same BGR buffer feeds the model and the quality metrics
+            try:
+                with stage_timer("upload", "decode"):
+                    img = decode_image(await run_in_threadpool(upload.read_bytes))
+            except Exception:
+                REJECTIONS.inc(operation="upload", reason="invalid_image")
+                raise HTTPException(status_code=400, detail="Invalid image file")
+
+            # One forward pass gives the dog verdict and the breed prediction
+            try:
+                with stage_timer("upload", "vision"):
+                    vision = await dog_vision_batcher.run(img)
+            except QueueFullError:
+                REJECTIONS.inc(operation="upload", reason="busy")
+                raise HTTPException(status_code=503, detail="Image analysis is busy, please retry shortly")
+            if not vision.is_dog:
+                REJECTIONS.inc(operation="upload", reason="not_a_dog")
+                raise HTTPException(status_code=400, detail=_not_a_dog(vision))
+        # Unique name, atomic rename: same-named uploads no longer overwrite each other
+        with stage_timer("upload", "commit"):
+            dst = await run_in_threadpool(upload.commit)
+    finally:
+        upload.discard()
+
+    with stage_timer("upload", "register"):
+        img_meta = await run_in_threadpool(register_image, file.filename, dst)
+
+    if analysis is None:
+        with stage_timer("upload", "metrics"):
+            quality = await run_in_threadpool(analyze_image_array, img)
+        analysis = _build_analysis(vision, quality)
+        await run_in_threadpool(analysis_cache.put, digest, analysis)
+
+    with stage_timer("upload", "persist"):
+        await run_in_threadpool(sessions.add_image_analysis, session_id, file.filename, analysis, dst)
+
+    return ImageAnalysis(image_id=img_meta["id"], **analysis)
+
+
+@app.post("/session/{session_id}/upload/analyze/batch", response_model=BatchImageAnalysis)
+async def upload_and_analyze_batch_in_session(session_id: str, files: List[UploadFile] = File(...)):
+    """
+    Several photos in one request. Images that miss the analysis cache go
+    through the vision model together (the batcher turns them into one
+    forward pass), quality metrics run in parallel, and every accepted image
+    is registered with a single storage write. Each file gets its own
+    result; a bad or non-dog photo doesn't fail the others.
+    """
+    if len(files) > MAX_BATCH_IMAGES:
+        REJECTIONS.inc(operation="upload_batch", reason="too_many_files")
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_IMAGES} images per request")
+    await run_in_threadpool(sessions.create_session_with_id, session_id)  # no-op for a live session
+
+    n = len(files)
+    uploads = [None] * n
+    analyses = [None] * n
+    errors = [None] * n  # (status_code, detail)
+
+    try:
+        with stage_timer("upload_batch", "spool"):
+            for i, file in enumerate(files):
+                try:
+                    uploads[i] = await spool_upload(file)
+                except UploadRejected as e:
+                    errors[i] = (e.status_code, e.detail)
+                    REJECTIONS.inc(operation="upload_batch",
+                                   reason=_UPLOAD_REJECT_REASONS.get(e.status_code, "invalid"))
+
+        # Cache hits are done; identical photos in one batch are analysed once
+        misses = {}
+        cached = await run_in_threadpool(
+            lambda: [analysis_cache.get(u.digest) if u is not None else None for u in uploads]
+        )
+        for i, upload in enumerate(uploads):
+            if upload is None:
+                continue
+            analyses[i] = cached[i]
+            if analyses[i] is None:
+                misses.setdefault(upload.digest, []).append(i)
+
+        async def decode(i):
+            try:
+                return decode_image(await run_in_threadpool(uploads[i].read_bytes))
+            except Exception:
+                return None
+
+        digests = list(misses)
+        with stage_timer("upload_batch", "decode"):
+            imgs = await asyncio.gather(*(decode(misses[d][0]) for d in digests))
+        decoded = [(d, img) for d, img in zip(digests, imgs) if img is not None]
+        for d, img in zip(digests, imgs):
+            if img is None:
+                for i in misses[d]:
+                    errors[i] = (400, "Invalid image file")
+                    REJECTIONS.inc(operation="upload_batch", reason="invalid_image")
+
+        # Submitted together, so the micro-batcher runs them as one batched tensor
+        with stage_timer("upload_batch", "vision"):
+            visions = await asyncio.gather(
+                *(dog_vision_batcher.run(img) for _, img in decoded), return_exceptions=True
+            )
+        dogs = []
+        for (d, img), vision in zip(decoded, visions):
+            if isinstance(vision, BaseException):
+                error, reason = ((503, "Image analysis is busy, please retry shortly"), "busy") \
+                    if isinstance(vision, QueueFullError) else ((500, "Image analysis failed"), "error")
+            elif not vision.is_dog:
+                error, reason = (400, _not_a_dog(vision)), "not_a_dog"
+            else:
+                dogs.append((d, img, vision))
+                continue
+            for i in misses[d]:
+                errors[i] = error
+                REJECTIONS.inc(operation="upload_batch", reason=reason)
+
+        with stage_timer("upload_batch", "metrics"):
+            quality = await asyncio.gather(*(run_in_threadpool(analyze_image_array, img) for _, img, _ in dogs))
+        fresh = [(d, _build_analysis(vision, m)) for (d, _, vision), m in zip(dogs, quality)]
+        await run_in_threadpool(lambda: [analysis_cache.put(d, analysis) for d, analysis in fresh])
+        for d, analysis in fresh:
+            for i in misses[d]:
+                analyses[i] = analysis
+
+        accepted = [i for i in range(n) if uploads[i] is not None and errors[i] is None]
+        with stage_timer("upload_batch", "commit"):
+            paths = await run_in_threadpool(lambda: [uploads[i].commit() for i in accepted])
+    finally:
+        for upload in uploads:
+            if upload is not None:
+                upload.discard()
+
+    # One registry write and one session update for the whole batch
+    with stage_timer("upload_batch", "register"):
+        metas = await run_in_threadpool(register_images, [(files[i].filename, p) for i, p in zip(accepted, paths)])
+    with stage_timer("upload_batch", "persist"):
+        await run_in_threadpool(
+            sessions.add_image_analyses,
+            session_id, [(files[i].filename, analyses[i], p) for i, p in zip(accepted, paths)],
+        )
+
+    image_ids = {i: meta["id"] for i, meta in zip(accepted, metas)}
+    results = []
+    for i, file in enumerate(files):
+        if i in image_ids:
+            results.append(BatchImageResult(
+                filename=file.filename, ok=True,
+                analysis=ImageAnalysis(image_id=image_ids[i], **analyses[i]),
+            ))
+        else:
+            results.append(BatchImageResult(
+                filename=file.filename, ok=False, status_code=errors[i][0], error=errors[i][1]
+            ))
+    return BatchImageAnalysis(accepted=len(accepted), rejected=n - len(accepted), results=results)
 
 
 # ----------------- END SESSION & GENERATE REPORT -----------------
+def _report_job_response(job: dict) -> dict:
+    # report_url stays None until the job is done; the PDF may not exist before that
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/report/jobs/{job['job_id']}",
+        "report_url": job["report_url"] if job["status"] == "done" else None,
+    }
+
+
 @app.post("/session/{session_id}/end")
 def end_session(session_id: str):
     data = sessions.end_session(session_id)
     if not data:
         raise HTTPException(status_code=404, detail="Invalid or already ended session")
 
-    pdf_path = create_session_report_pdf(session_id, data)
+    # Rendered by a report worker (unless an identical one exists); poll status_url until "done"
+    fingerprint = session_fingerprint(data)
+    pdf_path = cached_report(session_id, fingerprint)
+    if pdf_path:
+        report = {"status": "done", "report_url": f"/reports/{os.path.basename(pdf_path)}"}
+    else:
+        report = _report_job_response(report_jobs.submit(session_id, data, fingerprint))
     return {
         "session_id": session_id,
         "created_at": data.get("created_at"),
         "chat_summary": data.get("chat_history", []),
         "image_analyses": data.get("image_history", []),
-        "report_url": f"/reports/{os.path.basename(pdf_path)}",
-        "message": "Session ended. Report generated for this session only."
+        **report,
+        "message": "Session ended. Report for this session only is being generated."
     }
 
 
 # ----------------- ON-DEMAND SESSION REPORT -----------------
 @app.get("/session/{session_id}/report")
 def get_session_report(session_id: str):
-    # Load session data safely
-    if not sessions.exists(session_id):
-        path = os.path.join(sessions.SESSIONS_DIR, f"{session_id}.json")
-        if not os.path.exists(path):
-            raise HTTPException(status_code=404, detail="Session not found")
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    else:
-        data = sessions.get_history(session_id)
+    # Load session data safely (live or ended)
+    data = sessions.get_history(session_id)
+    if not data:
+        raise HTTPException(status_code=404, detail="Session not found")
 
     # Ensure chat_history and image_history are lists
     if "chat_history" not in data or not isinstance(data["chat_history"], list):
@@ -197,17 +548,36 @@ def get_session_report(session_id: str):
     if "image_history" not in data or not isinstance(data["image_history"], list):
         data["image_history"] = []
 
-    # Always generate PDF if not exists
-    pdf_path = os.path.join(REPORT_DIR, f"{session_id}.pdf")
-    if not os.path.exists(pdf_path):
-        pdf_path = create_session_report_pdf(session_id, data)
-
-    return {
+    summary = {
         "session_id": session_id,
-        "report_url": f"/reports/{os.path.basename(pdf_path)}",
         "chat_count": len(data.get("chat_history", [])),
         "image_count": len(data.get("image_history", [])),  # fixed typo
     }
 
+    # Serve the cached PDF while it matches the session's content, otherwise queue a render
+    fingerprint = session_fingerprint(data)
+    pdf_path = cached_report(session_id, fingerprint)
+    if pdf_path:
+        return {**summary, "status": "done", "report_url": f"/reports/{os.path.basename(pdf_path)}"}
+
+    job = report_jobs.submit(session_id, data, fingerprint)
+    return JSONResponse(status_code=202, content={**summary, **_report_job_response(job)})
+
+
+@app.get("/report/jobs/{job_id}")
+def report_job_status(job_id: str):
+    """queued / running / done (report_url is ready) / failed."""
+    job = report_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown report job")
+    return job
+
+
+@app.get("/report/metrics")
+def report_metrics():
+    return {"report_jobs": report_jobs.stats()}
 
 
+# ----------------- PROFILING (opt-in) -----------------
+# Installs nothing unless PROFILING_ENABLED and PROFILING_TOKEN are set; must run after all routes
+install_profiling(app)
@@ -1,13 +1,19 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 class ChatRequest(BaseModel):
     question: str = Field(..., min_length=2)
+    location: Optional[str] = None
 
 class ChatAnswer(BaseModel):
     answer: str
     matched_question: Optional[str] = None
     score: float
+    metadata: Dict[str, Any] = {}
+
+class BreedCandidate(BaseModel):
+    breed: str
+    confidence: float
 
 class ImageAnalysis(BaseModel):
     image_id: str
@@ -18,6 +24,19 @@ class ImageAnalysis(BaseModel):
     color_balance: float
     summary: str
     nutrition_tips: List[str]
+    top_breeds: List[BreedCandidate] = []
+
+class BatchImageResult(BaseModel):
+    filename: str
+    ok: bool
+    analysis: Optional[ImageAnalysis] = None
+    status_code: Optional[int] = None  # what the single-image endpoint would have returned
+    error: Optional[str] = None
+
+class BatchImageAnalysis(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[BatchImageResult]
 
 class ReportCreateRequest(BaseModel):
     image_id: Optional[str] = None
@@ -25,4 +44,8 @@ class ReportCreateRequest(BaseModel):
 
 class ReportInfo(BaseModel):
     report_id: str
-    url: str
\ No newline at end of file
+    url: str
+class ReportExportRequest(BaseModel):
+    report_ids: Optional[List[str]] = None
+    since: Optional[str] = None  # ISO date/time, inclusive
+    until: Optional[str] = None  # ISO date/time, exclusive
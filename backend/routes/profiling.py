@@ -0,0 +1,119 @@
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException
+from fastapi.responses import FileResponse
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+from services.profiling import (
+    PROFILING_DIR,
+    PROFILING_ENABLED,
+    PROFILING_MAX_SECONDS,
+    PROFILING_SAMPLE_INTERVAL_MS,
+    PROFILING_TOKEN,
+    STAT_KEYS,
+    ProfileRequestMiddleware,
+    ProfilerBusy,
+    list_outputs,
+    memory,
+    output_path,
+    profile_endpoint,
+    sampler,
+    token_ok,
+)
+
+
+def require_token(x_profiling_token: Optional[str] = Header(None)):
+    if not token_ok(x_profiling_token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+
+router = APIRouter(
+    prefix="/debug/profile", tags=["Profiling"], dependencies=[Depends(require_token)], include_in_schema=False,
+)
+
+
+def _stat_key(key: str) -> str:
+    if key not in STAT_KEYS:
+        raise HTTPException(status_code=400, detail=f"key must be one of {', '.join(STAT_KEYS)}")
+    return key
+
+
+@router.get("/")
+def profiling_status():
+    return {
+        "dir": PROFILING_DIR,
+        "max_sample_seconds": PROFILING_MAX_SECONDS,
+        "tracemalloc": memory.status(),
+        "files": len(list_outputs()),
+    }
+
+
+@router.post("/sample")
+async def sample_process(seconds: float = 10.0, interval_ms: float = PROFILING_SAMPLE_INTERVAL_MS):
+    """Sample every thread's stack for `seconds`; writes a collapsed-stack file for flamegraph.pl / speedscope."""
+    if not 0 < seconds <= PROFILING_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILING_MAX_SECONDS:g}]")
+    try:
+        return await run_in_threadpool(sampler.run, seconds, interval_ms)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/tracemalloc/start")
+def tracemalloc_start(frames: int = 25):
+    return memory.start(frames)
+
+
+@router.post("/tracemalloc/snapshot")
+def tracemalloc_snapshot(limit: int = 20, key: str = "lineno"):
+    """Top allocations now, and the growth since the previous snapshot."""
+    try:
+        return memory.snapshot(limit, _stat_key(key))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/tracemalloc/stop")
+def tracemalloc_stop():
+    return memory.stop()
+
+
+@router.get("/tracemalloc/diff")
+def tracemalloc_diff(base: str, new: str, limit: int = 20, key: str = "lineno"):
+    """Growth between two saved snapshot files."""
+    base_path, new_path = output_path(base), output_path(new)
+    if base_path is None or new_path is None:
+        raise HTTPException(status_code=404, detail="Snapshot file not found")
+    return {"base": base, "new": new, "diff": memory.diff_files(base_path, new_path, limit, _stat_key(key))}
+
+
+@router.get("/files")
+def profiling_files():
+    return list_outputs()
+
+
+@router.get("/files/{name}")
+def download_profiling_file(name: str):
+    path = output_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(path, filename=name)
+
+
+def install_profiling(app: FastAPI) -> bool:
+    """
+    Add the /debug/profile routes, the per-request capture middleware and
+    the endpoint wrappers. Does nothing unless PROFILING_ENABLED is set and
+    a PROFILING_TOKEN is configured, so a normal deployment runs exactly
+    the code it did before. Call after every route has been registered.
+    """
+    if not PROFILING_ENABLED:
+        return False
+    if not PROFILING_TOKEN:
+        print("PROFILING_ENABLED is set but PROFILING_TOKEN is empty; profiling stays off")
+        return False
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            route.dependant.call = profile_endpoint(route.dependant.call)
+    app.include_router(router)
+    app.add_middleware(ProfileRequestMiddleware)
+    return True
@@ -1,26 +1,122 @@
 from fastapi import APIRouter, HTTPException 
 from fastapi.responses import FileResponse, StreamingResponse 
-import os, io, zipfile 
-from services.storage import REPORT_DIR, list_reports as storage_list_reports 
+import os, io, zipfile, time 
+from typing import Iterator, List, Optional 
+from models.schemas import ReportExportRequest 
+from services.storage import REPORT_DIR, get_report, iter_reports, list_reports as storage_list_reports 
+
+# Read size while copying a report into the archive 
+EXPORT_CHUNK_BYTES = 64 * 1024 
 
 router = APIRouter(prefix="/reports", tags=["Reports"]) 
 @router.get("/list/", name="Get Reports List") 
 
 
-def reports_list(): 
-    """Return the registry (data/reports.json).""" 
-    return storage_list_reports() 
+def reports_list(limit: Optional[int] = None, offset: int = 0): 
+    """Return the report registry, optionally one page at a time.""" 
+    return storage_list_reports(limit=limit, offset=offset) 
 
 @router.get("/download/{report_id}/") 
 
 def download_report(report_id: str): 
-    reports = storage_list_reports() 
-    
-    # Find the report by id 
-    report = next((r for r in reports if r["id"] == report_id), None) 
-    if not report: 
+    # Indexed lookup by id 
+    try: 
+        report = get_report(report_id) 
+    except KeyError: 
         raise HTTPException(status_code=404, detail="Report not found") 
-    file_path = report.get("path") or os.path.join(REPORT_DIR, report["filename"]) 
-    if not os.path.exists(file_path): 
+    file_path = _report_file(report) 
+    if not file_path: 
         raise HTTPException(status_code=404, detail="File not found") 
-    return FileResponse( file_path, media_type="application/pdf", filename=report["filename"], )
\ No newline at end of file
+    return FileResponse( file_path, media_type="application/pdf", filename=report["filename"], )
+
+
+def _report_file(report: dict) -> Optional[str]:
+    """The report's PDF on disk; registry paths from another machine fall back to REPORT_DIR."""
+    for path in (report.get("path"), os.path.join(REPORT_DIR, report["filename"])):
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only, non-seekable sink for ZipFile. zipfile then writes data
+    descriptors after each member instead of seeking back, and we hand
+    out whatever has been written so far.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._offset = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self._offset += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        # zipfile records member offsets via tell() even when it can't seek
+        return self._offset
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks = []
+        return out
+
+
+def _zip_reports(reports: Iterator[dict]) -> Iterator[bytes]:
+    """
+    Stream a ZIP of the given reports. Memory stays bounded by one read
+    chunk plus zipfile's central directory (a few dozen bytes per member).
+    PDFs are already compressed, so they are STORED.
+    """
+    sink = _ChunkSink()
+    missing = []
+    seen = set()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as zf:
+        for report in reports:
+            path = _report_file(report)
+            if path is None or report["filename"] in seen:
+                if path is None:
+                    missing.append(report["id"])
+                continue
+            seen.add(report["filename"])
+            info = zipfile.ZipInfo(report["filename"], date_time=time.localtime(os.path.getmtime(path))[:6])
+            info.compress_type = zipfile.ZIP_STORED if path.lower().endswith(".pdf") else zipfile.ZIP_DEFLATED
+            with open(path, "rb") as src, zf.open(info, mode="w", force_zip64=True) as dst:
+                while True:
+                    chunk = src.read(EXPORT_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+        if missing:
+            zf.writestr("MISSING.txt", "Reports without a file on disk:\n" + "\n".join(missing) + "\n")
+    yield sink.drain()
+
+
+def _export_response(report_ids: Optional[List[str]], since: Optional[str], until: Optional[str]):
+    if report_ids is None and since is None and until is None:
+        raise HTTPException(status_code=400, detail="Give report_ids or a since/until date range")
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return StreamingResponse(
+        _zip_reports(iter_reports(report_ids=report_ids, since=since, until=until)),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="reports-{stamp}.zip"'},
+    )
+
+
+@router.get("/export/")
+def export_reports(since: Optional[str] = None, until: Optional[str] = None):
+    """ZIP of all reports created in [since, until), e.g. ?since=2025-08-01&until=2025-09-01."""
+    return _export_response(None, since, until)
+
+
+@router.post("/export/")
+def export_reports_by_id(req: ReportExportRequest):
+    """ZIP of the listed reports (or a date range), streamed as it is built."""
+    return _export_response(req.report_ids, req.since, req.until)
@@ -0,0 +1,101 @@
+# services/analysis_cache.py
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+from services.metrics import CACHE_REQUESTS
+from services.storage import DATA_DIR
+
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", os.path.join(DATA_DIR, "analysis_cache.db"))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "5000"))
+# A hit only rewrites last_used when it is older than this; eviction order doesn't need more
+ANALYSIS_CACHE_TOUCH_SECONDS = float(os.getenv("ANALYSIS_CACHE_TOUCH_SECONDS", "300"))
+
+
+class AnalysisCache:
+    """
+    Persistent upload-analysis cache keyed by (model tag, SHA-256 of the raw bytes).
+    The digest is the one `spool_upload()` computes while streaming the upload.
+
+    Entries are evicted least-recently-used once `max_entries` is exceeded;
+    recency is tracked to within `touch_seconds` so most hits are read-only.
+    The methods block on SQLite, so async callers run them in the threadpool.
+    The model tag is part of the key, so entries written by an older model or
+    analysis version simply stop matching and age out.
+    """
+
+    def __init__(self, model_tag: str, path: str = ANALYSIS_CACHE_PATH,
+                 max_entries: int = ANALYSIS_CACHE_MAX_ENTRIES,
+                 touch_seconds: float = ANALYSIS_CACHE_TOUCH_SECONDS):
+        self.model_tag = model_tag
+        self.max_entries = max_entries
+        self.touch_seconds = touch_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            " key TEXT PRIMARY KEY, analysis TEXT NOT NULL,"
+            " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS analyses_last_used ON analyses(last_used)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _key(self, digest: str) -> str:
+        return f"{self.model_tag}:{digest}"
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        key = self._key(digest)
+        with self._lock:
+            row = self._db.execute("SELECT analysis, last_used FROM analyses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._misses += 1
+                CACHE_REQUESTS.inc(cache="analysis", result="miss")
+                return None
+            now = time.time()
+            if now - row[1] >= self.touch_seconds:
+                self._db.execute("UPDATE analyses SET last_used = ? WHERE key = ?", (now, key))
+                self._db.commit()
+            self._hits += 1
+        CACHE_REQUESTS.inc(cache="analysis", result="hit")
+        return json.loads(row[0])
+
+    def put(self, digest: str, analysis: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO analyses (key, analysis, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (self._key(digest), json.dumps(analysis, ensure_ascii=False), now, now),
+            )
+            self._size += cur.rowcount
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._db.execute(
+                    "DELETE FROM analyses WHERE key IN"
+                    " (SELECT key FROM analyses ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                self._size -= overflow
+                self._evictions += overflow
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "model_tag": self.model_tag,
+                "entries": self._size,
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
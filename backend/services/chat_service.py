@@ -1,44 +1,74 @@
 import os
-import json
-from typing import Tuple
+import time
+from typing import List, Tuple
 
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
 
 # ✅ Import nutrient service
 from services.nutrient_service import calculate_nutrients
 
-# ✅ Import OpenAI
-from openai import OpenAI
+# ✅ Shared OpenAI client + lazy model registry
+from services.llm_service import get_client
+from services.model_registry import registry
+from services.semantic_cache import SemanticCache
+from services.faq_index import FaqIndex, FAQ_PATH
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 
-# Path to FAQ file
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))
-FAQ_PATH = os.path.join(BASE_DIR, "data", "faq.json")
 
-# Load FAQ
-with open(FAQ_PATH, "r", encoding="utf-8") as fp:
-    FAQ = json.load(fp)
+def _load_encoder():
+    # Imported here so startup doesn't pull in transformers until the FAQ is first queried
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL)
 
-QUESTIONS = list(FAQ.keys())
-ANSWERS = [FAQ[q] for q in QUESTIONS]
 
-# Load local embedding model (downloads once, then cached)
-MODEL = SentenceTransformer("all-MiniLM-L6-v2")
+# Local embedding model (downloads once, then cached) and FAQ embeddings load on first use.
+# Both are optional for readiness: without them FAQ matching is skipped and answers come from the LLM
+registry.register(
+    "sentence_encoder",
+    _load_encoder,
+    warmup=lambda m: m.encode(["warmup"], normalize_embeddings=True),
+    required=False,
+)
+# FAQ index over data/faq.json; hot-reloads when the file changes
+registry.register(
+    "faq_index",
+    lambda: FaqIndex(encode_batch=_encode_questions, path=FAQ_PATH),
+    required=False,
+)
 
-# Precompute embeddings for FAQ questions
-QUESTION_EMBEDDINGS = MODEL.encode(QUESTIONS, normalize_embeddings=True)
+
+def get_encoder():
+    return registry.get("sentence_encoder")
+
+
+def _encode_questions(texts: List[str]) -> np.ndarray:
+    return get_encoder().encode(texts, normalize_embeddings=True, batch_size=64)
+
+
+def _encode_question(text: str) -> np.ndarray:
+    return _encode_questions([text])[0]
+
+
+def search_faq(user_q: str, k: int = 3) -> List[Tuple[str, str, float]]:
+    """Top-k FAQ matches as (question, answer, similarity), best first."""
+    return registry.get("faq_index").search(_encode_question(user_q), k)
+
+
+# Repeated questions are answered from here instead of another LLM round trip
+semantic_cache = SemanticCache(encode=_encode_question, model=EMBEDDING_MODEL)
 
 
 def chatgpt_fallback(user_q: str) -> str:
     """
     Calls ChatGPT to get a natural answer.
     """
+    cached = semantic_cache.lookup(user_q, namespace="fallback")
+    if cached is not None:
+        return cached
     try:
-        response = client.chat.completions.create(
+        started = time.perf_counter()
+        response = get_client().chat.completions.create(
             model="gpt-4o-mini",  # lightweight, fast model
             messages=[
                 {"role": "system", "content": "You are a helpful veterinary AI assistant for dog health, nutrition, and wellness. Always be safe and professional."},
@@ -47,7 +77,9 @@ def chatgpt_fallback(user_q: str) -> str:
             temperature=0.7,
             max_tokens=400,
         )
-        return response.choices[0].message.content.strip()
+        answer = response.choices[0].message.content.strip()
+        semantic_cache.store(user_q, answer, namespace="fallback", latency_s=time.perf_counter() - started)
+        return answer
     except Exception as e:
         return f"⚠️ ChatGPT unavailable: {e}"
 
@@ -75,14 +107,15 @@ def answer_question(user_q: str, min_score: float = 0.6) -> Tuple[str, str, floa
             except Exception as e:
                 return f"⚠️ Could not calculate nutrition: {e}", "nutrition_error", 0.0
 
-        # 🔍 Step 2: Try FAQ semantic matching
-        user_vec = MODEL.encode([user_q], normalize_embeddings=True)
-        sims = cosine_similarity(user_vec, QUESTION_EMBEDDINGS)[0]
-        best_idx = int(np.argmax(sims))
-        best_score = float(sims[best_idx])
-
-        if best_score >= min_score:
-            return ANSWERS[best_idx], QUESTIONS[best_idx], best_score
+        # 🔍 Step 2: Try FAQ semantic matching (optional; skipped if the encoder/index is unavailable)
+        try:
+            matches = search_faq(user_q, k=1)
+        except Exception as e:
+            print("FAQ search unavailable:", e)
+            matches = []
+        if matches and matches[0][2] >= min_score:
+            best_q, best_answer, best_score = matches[0]
+            return best_answer, best_q, best_score
 
         # 🔍 Step 3: ChatGPT fallback
         gpt_answer = chatgpt_fallback(user_q)
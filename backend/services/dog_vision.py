@@ -0,0 +1,182 @@
+# services/dog_vision.py
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+import torch
+from torchvision import models, transforms
+from PIL import Image
+
+from services.inference_backend import RUNTIME, load_runtime
+from services.model_registry import registry
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # backend/
+ASSETS_DIR = os.path.join(BASE_DIR, "assets")
+LABELS_PATH = os.path.join(ASSETS_DIR, "imagenet_classes.txt")
+
+# One ImageNet-1k backbone serves both the dog check and breed prediction
+BACKBONE = os.getenv("DOG_VISION_BACKBONE", "resnet18")
+DOG_THRESHOLD = float(os.getenv("DOG_VISION_THRESHOLD", "0.30"))
+TOP_K = int(os.getenv("DOG_VISION_TOP_K", "5"))
+
+# Identifies everything that can change a prediction; bump the version on label/logic changes
+MODEL_VERSION = 2
+MODEL_TAG = f"{BACKBONE}-{RUNTIME}-t{DOG_THRESHOLD}-k{TOP_K}-v{MODEL_VERSION}"
+
+BACKBONES = {
+    "resnet18": (models.resnet18, models.ResNet18_Weights.IMAGENET1K_V1),
+    "resnet50": (models.resnet50, models.ResNet50_Weights.IMAGENET1K_V2),
+    "mobilenet_v3_small": (models.mobilenet_v3_small, models.MobileNet_V3_Small_Weights.IMAGENET1K_V1),
+    "mobilenet_v3_large": (models.mobilenet_v3_large, models.MobileNet_V3_Large_Weights.IMAGENET1K_V2),
+    "efficientnet_b0": (models.efficientnet_b0, models.EfficientNet_B0_Weights.IMAGENET1K_V1),
+}
+
+# ImageNet-1k classes 151..268 are the dog breeds
+BREED_START, BREED_END = 151, 269
+
+# Keywords that cover most dog breeds (ImageNet names don’t always include “dog”)
+DOG_KEYWORDS = {
+    "dog","retriever","terrier","poodle","beagle","husky","pug","spaniel","mastiff",
+    "shepherd","setter","collie","bulldog","chihuahua","malamute","samoyed",
+    "greyhound","whippet","boxer","rottweiler","doberman","pinscher","dalmatian",
+    "ridgeback","newfoundland","pointer","labrador","pomeranian","papillon","akita",
+    "saluki","borzoi","weimaraner","keeshond","vizsla","schipperke","affenpinscher",
+    "briard","komondor","pekinese","shihtzu","shih-tzu","schnauzer","great dane",
+    "corgi","dachshund","hound","wolfhound","springer","basset","bloodhound",
+}
+
+# Preprocessing for ImageNet models
+_MEAN = torch.tensor([0.485, 0.456, 0.406]).view(3, 1, 1)
+_STD = torch.tensor([0.229, 0.224, 0.225]).view(3, 1, 1)
+_preprocess = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(
+        mean=[0.485, 0.456, 0.406],
+        std=[0.229, 0.224, 0.225],
+    ),
+])
+
+
+@dataclass
+class DogVisionResult:
+    is_dog: bool
+    label: str                      # top-1 ImageNet label
+    confidence: float
+    breed: str                      # best class within the dog-breed range
+    breed_confidence: float
+    top_breeds: List[Tuple[str, float]] = field(default_factory=list)
+
+
+def build_model() -> torch.nn.Module:
+    """Fresh eager float32 backbone with pretrained ImageNet weights."""
+    if BACKBONE not in BACKBONES:
+        raise ValueError(f"Unknown DOG_VISION_BACKBONE '{BACKBONE}', choose from {sorted(BACKBONES)}")
+    builder, weights = BACKBONES[BACKBONE]
+    model = builder(weights=weights)
+    model.eval()
+    return model
+
+
+def _build_runtime():
+    # Eager, TorchScript, ONNX or int8 depending on DOG_VISION_RUNTIME
+    return load_runtime(RUNTIME, BACKBONE, build_model())
+
+
+def _warmup(model) -> None:
+    with torch.no_grad():
+        model(torch.zeros(1, 3, 224, 224))
+
+
+registry.register("dog_vision", _build_runtime, warmup=_warmup)
+
+
+def _load_model():
+    return registry.get("dog_vision")
+
+
+@lru_cache(maxsize=1)
+def _labels() -> List[str]:
+    with open(LABELS_PATH, "r", encoding="utf-8") as f:
+        return [l.strip() for l in f]
+
+
+def is_dog_label(label: str, conf: float, threshold: float = DOG_THRESHOLD) -> bool:
+    """Dog/not-dog verdict for an already computed (label, confidence)."""
+    if conf < threshold:
+        return False
+    name = label.lower()
+    return any(k in name for k in DOG_KEYWORDS)
+
+
+def _preprocess_array(img: np.ndarray) -> torch.Tensor:
+    # Resize the shared BGR buffer first so colour conversion and scaling touch only 224x224 pixels
+    small = cv2.resize(img, (224, 224), interpolation=cv2.INTER_AREA)
+    rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+    t = torch.from_numpy(rgb).permute(2, 0, 1).float().div_(255.0)
+    return t.sub_(_MEAN).div_(_STD)
+
+
+def preprocess(image_input: Union[str, Image.Image, np.ndarray]) -> torch.Tensor:
+    """
+    Accepts a file path, a PIL.Image or a decoded BGR array
+    (image_service.decode_image); returns a CHW tensor.
+    """
+    if isinstance(image_input, np.ndarray):
+        return _preprocess_array(image_input)
+    if isinstance(image_input, str):
+        img = Image.open(image_input).convert("RGB")
+    else:
+        img = image_input.convert("RGB")
+    return _preprocess(img)
+
+
+def predict_probs(batch: torch.Tensor) -> torch.Tensor:
+    """Softmax probabilities [N, 1000] for an already preprocessed batch."""
+    with torch.no_grad():
+        return torch.softmax(_load_model()(batch), dim=1)
+
+
+def results_from_probs(
+    probs: torch.Tensor, threshold: float = DOG_THRESHOLD, top_k: int = TOP_K
+) -> List[DogVisionResult]:
+    """Derive dog verdict, top breed and alternatives from one probability vector per image."""
+    labels = _labels()
+    conf, idx = probs.max(1)
+    breed_probs = probs[:, BREED_START:BREED_END]
+    k = max(1, min(top_k, breed_probs.shape[1]))
+    breed_conf, breed_idx = breed_probs.topk(k, dim=1)
+
+    results = []
+    for i in range(probs.shape[0]):
+        label, c = labels[int(idx[i])], float(conf[i])
+        top = [
+            (labels[BREED_START + int(j)], float(p))
+            for p, j in zip(breed_conf[i], breed_idx[i])
+        ]
+        results.append(DogVisionResult(
+            is_dog=is_dog_label(label, c, threshold),
+            label=label,
+            confidence=c,
+            breed=top[0][0],
+            breed_confidence=top[0][1],
+            top_breeds=top,
+        ))
+    return results
+
+
+def analyze_batch(
+    images: Sequence[Union[str, Image.Image, np.ndarray]],
+    threshold: float = DOG_THRESHOLD,
+    top_k: int = TOP_K,
+) -> List[DogVisionResult]:
+    """Preprocess once and run a single forward pass for all images."""
+    batch = torch.stack([preprocess(img) for img in images])
+    return results_from_probs(predict_probs(batch), threshold, top_k)
+
+
+def analyze(image_input: Union[str, Image.Image, np.ndarray], threshold: float = DOG_THRESHOLD) -> DogVisionResult:
+    return analyze_batch([image_input], threshold)[0]
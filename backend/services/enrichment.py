@@ -0,0 +1,108 @@
+# services/enrichment.py
+import os
+import time
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+from services.location_service import WEATHER_WAIT_SECONDS
+from services.metrics import STAGE_ERRORS, STAGE_SECONDS
+
+# Whole-request budget plus a per-component budget for each chat enricher
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "30"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "25"))
+NUTRIENT_TIMEOUT_SECONDS = float(os.getenv("NUTRIENT_TIMEOUT_SECONDS", "1"))
+# Covers the weather API's connect + read timeouts, so a slow but successful lookup isn't dropped
+LOCATION_TIMEOUT_SECONDS = float(os.getenv("LOCATION_TIMEOUT_SECONDS", str(WEATHER_WAIT_SECONDS + 0.5)))
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ENRICHMENT_WORKERS", "32")),
+    thread_name_prefix="enrich",
+)
+
+
+class FanOut:
+    """
+    Runs a request's enrichers concurrently under one deadline.
+
+    Each submitted call gets its own timeout, capped by what is left of the
+    request deadline. Optional components that time out or fail are dropped
+    (`result()` returns None) and recorded in `metadata()`; required ones
+    re-raise so the caller can fail the request. With an `operation`
+    name, each component's duration and failures are also recorded in the
+    per-stage metrics.
+    """
+
+    def __init__(self, deadline: float = CHAT_DEADLINE_SECONDS, operation: Optional[str] = None):
+        self.operation = operation
+        self._started = time.monotonic()
+        self._deadline = self._started + deadline
+        self._calls: Dict[str, Dict[str, Any]] = {}
+        self._degraded: List[Dict[str, str]] = []
+        self._timings: Dict[str, float] = {}
+
+    def submit(self, name: str, fn: Callable[..., Any], *args,
+               timeout: Optional[float] = None, required: bool = False) -> None:
+        def _timed():
+            started = time.monotonic()
+            try:
+                return fn(*args)
+            finally:
+                elapsed = time.monotonic() - started
+                self._timings[name] = round(elapsed * 1000.0, 1)
+                if self.operation:
+                    STAGE_SECONDS.observe(elapsed, operation=self.operation, stage=name)
+
+        expires = self._deadline if timeout is None else min(self._deadline, time.monotonic() + timeout)
+        self._calls[name] = {
+            "future": _executor.submit(_timed),
+            "expires": expires,
+            "required": required,
+        }
+
+    def _remaining(self, name: str) -> float:
+        return max(0.0, self._calls[name]["expires"] - time.monotonic())
+
+    def _failed(self, name: str, exc: Exception) -> None:
+        call = self._calls[name]
+        timed_out = isinstance(exc, (FutureTimeout, asyncio.TimeoutError))
+        if self.operation:
+            STAGE_ERRORS.inc(operation=self.operation, stage=name)
+        if timed_out:
+            call["future"].cancel()
+        if call["required"]:
+            if timed_out:
+                raise TimeoutError(f"{name} exceeded its time budget") from exc
+            raise exc
+        degraded = {"component": name, "reason": "timeout" if timed_out else "error"}
+        if not timed_out:
+            degraded["detail"] = str(exc)
+        self._degraded.append(degraded)
+
+    def result(self, name: str) -> Any:
+        """Blocking wait for one component within its remaining budget."""
+        future: Future = self._calls[name]["future"]
+        try:
+            return future.result(timeout=0 if future.done() else self._remaining(name))
+        except Exception as e:
+            self._failed(name, e)
+        return None
+
+    async def result_async(self, name: str) -> Any:
+        """Awaitable result() for async endpoints."""
+        future: Future = self._calls[name]["future"]
+        if future.done():
+            # Finished while the caller was busy (e.g. streaming); don't let an expired budget drop it
+            return self.result(name)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self._remaining(name))
+        except Exception as e:
+            self._failed(name, e)
+        return None
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "degraded": list(self._degraded),
+            "timings_ms": dict(self._timings),
+            "elapsed_ms": round((time.monotonic() - self._started) * 1000.0, 1),
+        }
@@ -0,0 +1,173 @@
+# services/faq_index.py
+import os
+import json
+import time
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+FAQ_PATH = os.path.join(BASE_DIR, "data", "faq.json")
+
+# Switch to an approximate (faiss HNSW) index once the FAQ is this large
+FAQ_ANN_MIN_SIZE = int(os.getenv("FAQ_ANN_MIN_SIZE", "20000"))
+# How often search() checks faq.json for changes
+FAQ_RELOAD_INTERVAL = float(os.getenv("FAQ_RELOAD_INTERVAL", "5"))
+
+EncodeBatch = Callable[[List[str]], np.ndarray]
+
+
+class FaqIndex:
+    """
+    Question -> answer index over normalized embeddings.
+
+    Embeddings live in one contiguous float32 matrix, so exact top-k is a
+    single matrix-vector product plus argpartition. Entries can be added and
+    removed without re-encoding the rest, and `faq.json` is re-read when its
+    mtime changes, encoding only new questions. Large indexes optionally
+    use faiss HNSW when it is installed.
+    """
+
+    def __init__(self, encode_batch: EncodeBatch, path: Optional[str] = FAQ_PATH,
+                 ann_min_size: int = FAQ_ANN_MIN_SIZE, reload_interval: float = FAQ_RELOAD_INTERVAL):
+        self._encode = encode_batch
+        self.path = path
+        self.ann_min_size = ann_min_size
+        self.reload_interval = reload_interval
+        self._lock = threading.RLock()
+        self._questions: List[str] = []
+        self._answers: List[str] = []
+        self._row: Dict[str, int] = {}
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._size = 0
+        self._ann = None
+        self._ann_dirty = True
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        if path:
+            self.reload_if_changed(force=True)
+
+    def __len__(self) -> int:
+        return self._size
+
+    # ---- mutation ----
+    def add(self, entries: Dict[str, str]) -> int:
+        """Add or update entries; only questions not already indexed are encoded."""
+        with self._lock:
+            new_qs = [q for q in entries if q not in self._row]
+            for q, a in entries.items():
+                if q in self._row:
+                    self._answers[self._row[q]] = a
+            if not new_qs:
+                return 0
+            vecs = np.ascontiguousarray(self._encode(new_qs), dtype=np.float32)
+            self._reserve(self._size + len(new_qs), vecs.shape[1])
+            start = self._size
+            self._matrix[start:start + len(new_qs)] = vecs
+            for i, q in enumerate(new_qs):
+                self._row[q] = start + i
+                self._questions.append(q)
+                self._answers.append(entries[q])
+            self._size += len(new_qs)
+            if self._ann is not None and not self._ann_dirty:
+                self._ann.add(vecs)
+            else:
+                self._ann_dirty = True
+            return len(new_qs)
+
+    def remove(self, questions: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for q in questions:
+                row = self._row.pop(q, None)
+                if row is None:
+                    continue
+                last = self._size - 1
+                if row != last:
+                    # Move the last entry into the hole to keep the matrix dense
+                    self._matrix[row] = self._matrix[last]
+                    self._questions[row] = self._questions[last]
+                    self._answers[row] = self._answers[last]
+                    self._row[self._questions[row]] = row
+                self._questions.pop()
+                self._answers.pop()
+                self._size -= 1
+                removed += 1
+            if removed:
+                self._ann_dirty = True
+        return removed
+
+    def _reserve(self, n: int, dim: int) -> None:
+        cap = self._matrix.shape[0]
+        if self._matrix.shape[1] != dim and self._size == 0:
+            self._matrix = np.zeros((max(n, 16), dim), dtype=np.float32)
+            return
+        if n > cap:
+            grown = np.zeros((max(n, cap * 2), dim), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+
+    # ---- hot reload ----
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """Sync with faq.json if its mtime changed. Returns True if a reload happened."""
+        if not self.path:
+            return False
+        now = time.monotonic()
+        if not force and now - self._last_check < self.reload_interval:
+            return False
+        self._last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if not force and mtime == self._mtime:
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as fp:
+                faq = json.load(fp)
+            if not isinstance(faq, dict):
+                raise ValueError("expected a JSON object of question -> answer")
+        except (OSError, ValueError) as e:
+            # Possibly caught mid-write; keep the current index and retry on the next check
+            print(f"Could not reload {self.path}:", e)
+            return False
+        with self._lock:
+            self.remove([q for q in self._questions if q not in faq])
+            self.add(faq)
+            self._mtime = mtime
+        return True
+
+    # ---- search ----
+    def _build_ann(self):
+        try:
+            import faiss
+        except ImportError:
+            return None
+        index = faiss.IndexHNSWFlat(self._matrix.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+        index.add(self._matrix[:self._size])
+        return index
+
+    def search(self, query_vec: np.ndarray, k: int = 1) -> List[Tuple[str, str, float]]:
+        """Top-k (question, answer, cosine score), best first. `query_vec` must be normalized."""
+        self.reload_if_changed()
+        q = np.ascontiguousarray(query_vec, dtype=np.float32).reshape(-1)
+        with self._lock:
+            n = self._size
+            if n == 0:
+                return []
+            k = min(k, n)
+            if n >= self.ann_min_size:
+                if self._ann_dirty:
+                    self._ann = self._build_ann()
+                    self._ann_dirty = False
+                if self._ann is not None:
+                    scores, idx = self._ann.search(q.reshape(1, -1), k)
+                    return [
+                        (self._questions[i], self._answers[i], float(s))
+                        for s, i in zip(scores[0], idx[0]) if i >= 0
+                    ]
+            sims = self._matrix[:n] @ q
+            top = np.argpartition(-sims, k - 1)[:k] if k < n else np.arange(n)
+            top = top[np.argsort(-sims[top])]
+            return [(self._questions[i], self._answers[i], float(sims[i])) for i in top]
@@ -1,14 +1,29 @@
 import os
+import io
 import cv2
 import numpy as np
-from typing import Tuple, List
+from PIL import Image
+from typing import Optional, Tuple, List
 
-def _calc_brightness(img: np.ndarray) -> float:
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+# Bump when thresholds or wording change so cached analyses are recomputed
+ANALYSIS_VERSION = 1
+
+def decode_image(raw: bytes) -> np.ndarray:
+    """
+    Decode upload bytes once into a BGR uint8 array shared by the quality
+    metrics and model preprocessing. Falls back to PIL for formats OpenCV
+    can't read (e.g. GIF).
+    """
+    img = cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        rgb = np.asarray(Image.open(io.BytesIO(raw)).convert("RGB"))
+        img = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    return img
+
+def _calc_brightness(gray: np.ndarray) -> float:
     return float(gray.mean() / 255.0)
 
-def _calc_clarity(img: np.ndarray) -> float:
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+def _calc_clarity(gray: np.ndarray) -> float:
     var_lap = cv2.Laplacian(gray, cv2.CV_64F).var()
     # Normalize variance to 0..1 using soft scale
     score = 1.0 - np.exp(-var_lap / 500.0)
@@ -26,9 +41,15 @@ def analyze_image(path: str) -> Tuple[float, float, float, str, List[str]]:
     img = cv2.imread(path)
     if img is None:
         raise ValueError("Cannot read image")
+    return analyze_image_array(img)
+
+def analyze_image_array(img: np.ndarray, gray: Optional[np.ndarray] = None) -> Tuple[float, float, float, str, List[str]]:
+    """In-memory entry point: `img` is a decoded BGR array (see decode_image)."""
+    if gray is None:
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
-    brightness = _calc_brightness(img)
-    clarity = _calc_clarity(img)
+    brightness = _calc_brightness(gray)
+    clarity = _calc_clarity(gray)
     color_balance = _calc_color_balance(img)
 
     notes = []
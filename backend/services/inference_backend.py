@@ -0,0 +1,262 @@
+# services/inference_backend.py
+"""
+Pluggable CPU inference runtimes for the dog vision backbone.
+
+    eager        plain float32 PyTorch module
+    torchscript  traced + frozen TorchScript graph
+    onnx         ONNX graph run by onnxruntime (optional dependency)
+    onnx_int8    ONNX graph with dynamic int8 weight quantization
+    int8         static post-training int8 quantization (FX graph mode),
+                 calibrated on the sample images in uploaded_images/
+
+Exported artifacts are cached in data/model_cache/ and reused on the next
+start. Every runtime is a callable taking a preprocessed [N, 3, 224, 224]
+float tensor and returning logits [N, 1000].
+
+Parity check against eager:
+    python -m services.inference_backend --parity int8
+"""
+import os
+import glob
+import time
+import argparse
+from typing import Callable, Dict, List, Optional
+
+import torch
+
+from services.storage import DATA_DIR, UPLOAD_DIR
+
+RUNTIME = os.getenv("DOG_VISION_RUNTIME", "eager")
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(DATA_DIR, "model_cache"))
+CALIBRATION_IMAGES = int(os.getenv("INT8_CALIBRATION_IMAGES", "32"))
+
+RUNTIMES = ("eager", "torchscript", "onnx", "onnx_int8", "int8")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+Runner = Callable[[torch.Tensor], torch.Tensor]
+
+
+def _artifact_path(backbone: str, runtime: str, ext: str) -> str:
+    # torch version is part of the name so an upgrade re-exports instead of loading stale graphs
+    version = torch.__version__.split("+")[0]
+    return os.path.join(MODEL_CACHE_DIR, f"{backbone}-{runtime}-torch{version}.{ext}")
+
+
+def _example_input(batch: int = 1) -> torch.Tensor:
+    return torch.randn(batch, 3, 224, 224)
+
+
+def _save_atomic(path: str, write: Callable[[str], None]) -> None:
+    """Write an artifact via temp file + rename, so a crash never leaves a truncated one at `path`."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def sample_images(image_dir: str = UPLOAD_DIR, limit: Optional[int] = None) -> List[str]:
+    paths = sorted(
+        p for p in glob.glob(os.path.join(image_dir, "*"))
+        if p.lower().endswith(IMAGE_EXTS)
+    )
+    return paths[:limit] if limit else paths
+
+
+# ---- runtimes ----
+def _torchscript(model: torch.nn.Module, backbone: str) -> Runner:
+    path = _artifact_path(backbone, "torchscript", "pt")
+    if not os.path.exists(path):
+        with torch.no_grad():
+            traced = torch.jit.trace(model, _example_input())
+            traced = torch.jit.freeze(traced)
+        _save_atomic(path, traced.save)
+    scripted = torch.jit.load(path)
+    scripted.eval()
+    return torch.jit.optimize_for_inference(scripted)
+
+
+def _export_onnx(model: torch.nn.Module, backbone: str) -> str:
+    path = _artifact_path(backbone, "onnx", "onnx")
+    if not os.path.exists(path):
+        _save_atomic(path, lambda tmp: torch.onnx.export(
+            model,
+            _example_input(),
+            tmp,
+            input_names=["input"],
+            output_names=["logits"],
+            dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=17,
+        ))
+    return path
+
+
+class _OnnxRunner:
+    def __init__(self, path: str):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("The onnx runtimes need onnxruntime: pip install onnxruntime")
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        logits = self._session.run(None, {"input": batch.contiguous().numpy()})[0]
+        return torch.from_numpy(logits)
+
+
+def _onnx(model: torch.nn.Module, backbone: str) -> Runner:
+    return _OnnxRunner(_export_onnx(model, backbone))
+
+
+def _onnx_int8(model: torch.nn.Module, backbone: str) -> Runner:
+    path = _artifact_path(backbone, "onnx_int8", "onnx")
+    if not os.path.exists(path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        source = _export_onnx(model, backbone)
+        _save_atomic(path, lambda tmp: quantize_dynamic(source, tmp, weight_type=QuantType.QInt8))
+    return _OnnxRunner(path)
+
+
+def _load_sample(path: str) -> torch.Tensor:
+    """[1, 3, 224, 224] batch for one image, through the same decode + preprocessing as uploads."""
+    from services.dog_vision import preprocess
+    from services.image_service import decode_image
+
+    with open(path, "rb") as fp:
+        return preprocess(decode_image(fp.read())).unsqueeze(0)
+
+
+def _calibration_batches(limit: int) -> List[torch.Tensor]:
+    batches = []
+    for path in sample_images(limit=limit):
+        try:
+            batches.append(_load_sample(path))
+        except Exception:
+            continue
+    # Fall back to noise so an empty upload folder still produces a usable graph
+    return batches or [_example_input() for _ in range(8)]
+
+
+def _quantized_engine() -> str:
+    engines = torch.backends.quantized.supported_engines
+    return "x86" if "x86" in engines else "fbgemm"
+
+
+def _int8(model: torch.nn.Module, backbone: str) -> Runner:
+    # The graph only runs correctly (and fast) on the engine it was quantized for,
+    # so set it for loading a cached graph too; the engine is part of the file name
+    engine = _quantized_engine()
+    torch.backends.quantized.engine = engine
+    path = _artifact_path(backbone, f"int8-{engine}", "pt")
+    if not os.path.exists(path):
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+        qconfig = get_default_qconfig_mapping(engine)
+        prepared = prepare_fx(model, qconfig, example_inputs=(_example_input(),))
+        with torch.no_grad():
+            for batch in _calibration_batches(CALIBRATION_IMAGES):
+                prepared(batch)
+            quantized = convert_fx(prepared)
+            traced = torch.jit.freeze(torch.jit.trace(quantized, _example_input()))
+        _save_atomic(path, traced.save)
+    scripted = torch.jit.load(path)
+    scripted.eval()
+    return scripted
+
+
+_LOADERS: Dict[str, Callable[[torch.nn.Module, str], Runner]] = {
+    "torchscript": _torchscript,
+    "onnx": _onnx,
+    "onnx_int8": _onnx_int8,
+    "int8": _int8,
+}
+
+
+def load_runtime(runtime: str, backbone: str, model: torch.nn.Module) -> Runner:
+    """Wrap an eager float32 model in the requested runtime, exporting it once if needed."""
+    if runtime not in RUNTIMES:
+        raise ValueError(f"Unknown DOG_VISION_RUNTIME '{runtime}', choose from {RUNTIMES}")
+    model.eval()
+    if runtime == "eager":
+        return model
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    return _LOADERS[runtime](model, backbone)
+
+
+# ---- accuracy parity ----
+def check_parity(runtime: str, image_dir: str = UPLOAD_DIR, limit: Optional[int] = None) -> Dict:
+    """
+    Compare a runtime against eager float32 on the sample images.
+    Reports top-1 / breed / dog-verdict agreement, max probability drift and latency.
+    """
+    from services import dog_vision
+
+    eager = dog_vision.build_model()
+    candidate = load_runtime(runtime, dog_vision.BACKBONE, dog_vision.build_model())
+
+    n = top1 = breed = verdict = 0
+    max_diff = 0.0
+    t_eager: List[float] = []
+    t_cand: List[float] = []
+    for path in sample_images(image_dir, limit):
+        try:
+            batch = _load_sample(path)
+        except Exception:
+            continue
+        with torch.no_grad():
+            t0 = time.perf_counter()
+            p_ref = torch.softmax(eager(batch), dim=1)
+            t1 = time.perf_counter()
+            p_new = torch.softmax(candidate(batch), dim=1)
+            t2 = time.perf_counter()
+        t_eager.append(t1 - t0)
+        t_cand.append(t2 - t1)
+
+        ref, new = dog_vision.results_from_probs(p_ref)[0], dog_vision.results_from_probs(p_new)[0]
+        n += 1
+        top1 += ref.label == new.label
+        breed += ref.breed == new.breed
+        verdict += ref.is_dog == new.is_dog
+        max_diff = max(max_diff, float((p_ref - p_new).abs().max()))
+
+    def _p50(xs: List[float]) -> float:
+        return round(sorted(xs)[len(xs) // 2] * 1000.0, 2) if xs else 0.0
+
+    return {
+        "runtime": runtime,
+        "backbone": dog_vision.BACKBONE,
+        "images": n,
+        "top1_agreement": round(top1 / n, 4) if n else None,
+        "breed_agreement": round(breed / n, 4) if n else None,
+        "dog_verdict_agreement": round(verdict / n, 4) if n else None,
+        "max_prob_abs_diff": round(max_diff, 5),
+        "eager_p50_ms": _p50(t_eager),
+        "runtime_p50_ms": _p50(t_cand),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export dog vision runtimes and check parity with eager.")
+    parser.add_argument("--export", choices=RUNTIMES, help="export and cache one runtime")
+    parser.add_argument("--parity", choices=RUNTIMES, help="compare a runtime against eager")
+    parser.add_argument("--dir", default=UPLOAD_DIR, help="image folder for the parity check")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--min-agreement", type=float, default=0.95,
+                        help="exit non-zero if top-1 agreement falls below this")
+    args = parser.parse_args()
+
+    if args.export:
+        from services import dog_vision
+        load_runtime(args.export, dog_vision.BACKBONE, dog_vision.build_model())
+        print(f"cached {args.export} runtime in {MODEL_CACHE_DIR}")
+    if args.parity:
+        report = check_parity(args.parity, args.dir, args.limit)
+        for k, v in report.items():
+            print(f"{k}: {v}")
+        if report["top1_agreement"] is not None and report["top1_agreement"] < args.min_agreement:
+            raise SystemExit(1)
@@ -0,0 +1,181 @@
+# services/inference_scheduler.py
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from services.metrics import metrics
+
+# Defaults can be tuned per deployment without code changes
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8"))
+MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+MAX_QUEUE_DEPTH = int(os.getenv("INFERENCE_MAX_QUEUE_DEPTH", "256"))
+
+_SCHEDULERS: Dict[str, "MicroBatcher"] = {}
+
+IN_FLIGHT = metrics.gauge("inference_in_flight", "Items queued or running in a scheduler", ("batcher",))
+BATCH_SIZE = metrics.histogram(
+    "inference_batch_size", "Items per batched forward pass", ("batcher",), buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+QUEUE_WAIT = metrics.histogram("inference_queue_wait_seconds", "Time an item waited for its batch", ("batcher",))
+BATCH_SECONDS = metrics.histogram("inference_batch_seconds", "Run time of one batch", ("batcher",))
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a scheduler already holds `max_queue_depth` pending items."""
+
+
+class MicroBatcher:
+    """
+    Collects single inference requests into batches.
+
+    Callers `submit()` one item and get a Future back. A background worker
+    waits for the first item, then keeps collecting until either
+    `max_batch_size` items are queued or `max_wait_ms` has passed since that
+    first item arrived, and calls `batch_fn(items)` once for the whole batch.
+    `batch_fn` must return one result per item, in the same order.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[Sequence[Any]], List[Any]],
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait_ms: float = MAX_WAIT_MS,
+        max_queue_depth: int = MAX_QUEUE_DEPTH,
+    ):
+        self.name = name
+        self._batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue_depth = max_queue_depth
+
+        self._queue: Deque[Tuple[Any, Future, float]] = deque()
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+
+        # ---- metrics ----
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._rejected = 0
+        self._batch_sizes: Dict[int, int] = {}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+        self._queue_peak = 0
+
+        _SCHEDULERS[name] = self
+
+    # ---- API ----
+    def submit(self, item: Any) -> Future:
+        fut: Future = Future()
+        with self._cond:
+            if self.max_queue_depth and len(self._queue) >= self.max_queue_depth:
+                self._rejected += 1
+                raise QueueFullError(f"{self.name} inference queue is full")
+            self._queue.append((item, fut, time.perf_counter()))
+            self._queue_peak = max(self._queue_peak, len(self._queue))
+            self._ensure_worker()
+            self._cond.notify()
+        IN_FLIGHT.inc(batcher=self.name)
+        fut.add_done_callback(lambda _: IN_FLIGHT.dec(batcher=self.name))
+        return fut
+
+    def predict(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """Blocking helper for sync callers."""
+        return self.submit(item).result(timeout=timeout)
+
+    async def run(self, item: Any) -> Any:
+        """Awaitable helper for async endpoints."""
+        return await asyncio.wrap_future(self.submit(item))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            items = self._items
+            batches = self._batches
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "max_queue_depth": self.max_queue_depth,
+                "queue_depth": len(self._queue),
+                "queue_depth_peak": self._queue_peak,
+                "batches": batches,
+                "items": items,
+                "errors": self._errors,
+                "rejected": self._rejected,
+                "avg_batch_size": round(items / batches, 3) if batches else 0.0,
+                "batch_size_counts": dict(sorted(self._batch_sizes.items())),
+                "avg_wait_ms": round(self._wait_total / items * 1000.0, 3) if items else 0.0,
+                "max_wait_ms_observed": round(self._wait_max * 1000.0, 3),
+                "avg_batch_run_ms": round(self._run_total / batches * 1000.0, 3) if batches else 0.0,
+            }
+
+    # ---- worker ----
+    def _ensure_worker(self) -> None:
+        # Called with self._cond held
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._loop, name=f"inference-{self.name}", daemon=True
+            )
+            self._worker.start()
+
+    def _next_batch(self) -> List[Tuple[Any, Future, float]]:
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(self.max_batch_size, len(self._queue))
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            # Skip requests whose caller already gave up
+            batch = [b for b in batch if b[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self._batch_fn([item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"{self.name} returned {len(results)} results for {len(batch)} inputs"
+                    )
+            except Exception as e:
+                for _, fut, _ in batch:
+                    fut.set_exception(e)
+                failed = True
+            else:
+                for (_, fut, _), res in zip(batch, results):
+                    fut.set_result(res)
+                failed = False
+            finished = time.perf_counter()
+
+            with self._cond:
+                self._batches += 1
+                self._items += len(batch)
+                self._errors += int(failed)
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+                self._run_total += finished - started
+                for _, _, enqueued in batch:
+                    waited = started - enqueued
+                    self._wait_total += waited
+                    self._wait_max = max(self._wait_max, waited)
+            BATCH_SIZE.observe(len(batch), batcher=self.name)
+            BATCH_SECONDS.observe(finished - started, batcher=self.name)
+            for _, _, enqueued in batch:
+                QUEUE_WAIT.observe(started - enqueued, batcher=self.name)
+
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    """Metrics for every scheduler created in this process."""
+    return {name: s.stats() for name, s in _SCHEDULERS.items()}
@@ -1,13 +1,25 @@
-from openai import OpenAI
+from typing import AsyncIterator
 
-# Create client once
-client = OpenAI()
+from openai import AsyncOpenAI, OpenAI
 
-def generate_dynamic_answer(user_msg, history, location=None):
-    """
-    Sends user query + history to LLM to generate dynamic answer
-    with follow-up questions (ChatGPT-style).
-    """
+from services.model_registry import registry
+
+LLM_MODEL = "gpt-4o-mini"
+
+# Created on first use and shared with chat_service
+registry.register("openai_client", OpenAI)
+registry.register("openai_async_client", AsyncOpenAI)
+
+
+def get_client() -> OpenAI:
+    return registry.get("openai_client")
+
+
+def get_async_client() -> AsyncOpenAI:
+    return registry.get("openai_async_client")
+
+
+def _build_messages(user_msg, history, location=None):
     messages = [
         {
             "role": "system",
@@ -29,12 +41,40 @@ def generate_dynamic_answer(user_msg, history, location=None):
     if location:
         user_content += f"\n(Location: {location})"
     messages.append({"role": "user", "content": user_content})
+    return messages
 
+
+def generate_dynamic_answer(user_msg, history, location=None, timeout=None):
+    """
+    Sends user query + history to LLM to generate dynamic answer
+    with follow-up questions (ChatGPT-style).
+    """
     # Call OpenAI API (new syntax for v1.0+)
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
+    response = get_client().chat.completions.create(
+        model=LLM_MODEL,
+        messages=_build_messages(user_msg, history, location),
         temperature=0.7,
+        timeout=timeout,
     )
 
     return response.choices[0].message.content
+
+
+async def stream_dynamic_answer(user_msg, history, location=None, timeout=None) -> AsyncIterator[str]:
+    """
+    Same prompt as generate_dynamic_answer, but yields content deltas
+    as the completion is generated.
+    """
+    stream = await get_async_client().chat.completions.create(
+        model=LLM_MODEL,
+        messages=_build_messages(user_msg, history, location),
+        temperature=0.7,
+        stream=True,
+        timeout=timeout,
+    )
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
@@ -1,4 +1,177 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Dict, Optional
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from services.model_registry import registry
+
+OPENWEATHER_URL = os.getenv("OPENWEATHER_URL", "http://api.openweathermap.org/data/2.5/weather")
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "YOUR_KEY")
+
+# Never let a slow weather API hold up a chat reply
+WEATHER_CONNECT_TIMEOUT = float(os.getenv("WEATHER_CONNECT_TIMEOUT", "0.5"))
+WEATHER_HTTP_TIMEOUT = float(os.getenv("WEATHER_HTTP_TIMEOUT", "2"))
+WEATHER_POOL_SIZE = int(os.getenv("WEATHER_POOL_SIZE", "10"))
+# Longest a caller waits on a lookup, its own or a shared one: the whole HTTP budget
+WEATHER_WAIT_SECONDS = WEATHER_CONNECT_TIMEOUT + WEATHER_HTTP_TIMEOUT
+
+# Weather for a city barely changes over minutes
+WEATHER_TTL_SECONDS = float(os.getenv("WEATHER_TTL_SECONDS", "600"))
+WEATHER_STALE_SECONDS = float(os.getenv("WEATHER_STALE_SECONDS", "3600"))
+WEATHER_NEGATIVE_TTL_SECONDS = float(os.getenv("WEATHER_NEGATIVE_TTL_SECONDS", "120"))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "2048"))
+
+
+def normalize_location(location: str) -> str:
+    """'  New York ,US ' and 'new york, us' share one cache entry."""
+    parts = [" ".join(p.split()) for p in location.lower().split(",")]
+    return ",".join(p for p in parts if p)
+
+
+class WeatherBackend:
+    """Fetches current conditions; returns e.g. {"temp": 21.5} or raises."""
+
+    def fetch(self, location: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class OpenWeatherMapBackend(WeatherBackend):
+    """
+    OpenWeatherMap over a keep-alive connection pool. `base_url` can point
+    at a local stub server in tests.
+    """
+
+    def __init__(self, base_url: str = OPENWEATHER_URL, api_key: str = OPENWEATHER_API_KEY,
+                 timeout: float = WEATHER_HTTP_TIMEOUT, pool_size: int = WEATHER_POOL_SIZE):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = (WEATHER_CONNECT_TIMEOUT, timeout)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def fetch(self, location: str) -> Dict[str, Any]:
+        resp = self._session.get(
+            self.base_url,
+            params={"q": location, "appid": self.api_key, "units": "metric"},
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        if "main" not in data:
+            raise LookupError(f"No weather for '{location}'")
+        return {"temp": data["main"]["temp"]}
+
+
+class LocationContextProvider:
+    """
+    In-process TTL cache in front of a WeatherBackend.
+
+    - fresh entries (< ttl) are served directly
+    - stale entries (< stale_ttl) are served while one background refresh runs
+    - failed lookups are remembered for negative_ttl so a bad city name or an
+      outage doesn't cost a network round-trip on every message
+    Concurrent misses for the same location share one request.
+    """
+
+    def __init__(self, backend: Optional[WeatherBackend] = None,
+                 ttl: float = WEATHER_TTL_SECONDS, stale_ttl: float = WEATHER_STALE_SECONDS,
+                 negative_ttl: float = WEATHER_NEGATIVE_TTL_SECONDS,
+                 max_entries: int = WEATHER_CACHE_MAX_ENTRIES):
+        self.backend = backend or OpenWeatherMapBackend()
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (fetched_at, value or None for a failed lookup)
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="weather-refresh")
+        self._stats = {"hits": 0, "stale_hits": 0, "negative_hits": 0, "misses": 0,
+                       "refreshes": 0, "errors": 0}
+
+    def get_weather(self, location: str) -> Optional[Dict[str, Any]]:
+        key = normalize_location(location)
+        if not key:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                fetched_at, value = entry
+                age = now - fetched_at
+                if value is None and age < self.negative_ttl:
+                    self._cache.move_to_end(key)
+                    self._stats["negative_hits"] += 1
+                    return None
+                if value is not None and age < self.ttl:
+                    self._cache.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                if value is not None and age < self.stale_ttl:
+                    self._cache.move_to_end(key)
+                    self._stats["stale_hits"] += 1
+                    self._refresh_in_background(key, location)
+                    return value
+            self._stats["misses"] += 1
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if owner:
+            self._fetch(key, location, future)
+        try:
+            return future.result(timeout=WEATHER_WAIT_SECONDS)
+        except FutureTimeout:
+            return None
+
+    def _refresh_in_background(self, key: str, location: str) -> None:
+        # Called with self._lock held
+        if key in self._inflight:
+            return
+        future = Future()
+        self._inflight[key] = future
+        self._stats["refreshes"] += 1
+        self._refresher.submit(self._fetch, key, location, future)
+
+    def _fetch(self, key: str, location: str, future: Future) -> None:
+        try:
+            value = self.backend.fetch(location)
+        except Exception:
+            value = None
+        with self._lock:
+            now = time.monotonic()
+            entry = self._cache.get(key)
+            if value is None:
+                self._stats["errors"] += 1
+            if value is None and entry is not None and entry[1] is not None \
+                    and now - entry[0] < self.stale_ttl:
+                # Failed refresh: keep serving the stale value rather than negative-caching
+                value = entry[1]
+            else:
+                self._cache[key] = (now, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._cache)}
+
+
+# Weather is an optional enrichment; a failure here must not keep the worker unready
+registry.register("location_provider", LocationContextProvider, required=False)
+
 
 def enrich_with_location(location: str, query: str):
     """
@@ -7,18 +180,14 @@ def enrich_with_location(location: str, query: str):
     """
     advice = []
 
-    # Weather check
-    try:
-        weather_api = f"http://api.openweathermap.org/data/2.5/weather?q={location}&appid=YOUR_KEY&units=metric"
-        data = requests.get(weather_api).json()
-        if "main" in data:
-            temp = data["main"]["temp"]
-            if temp > 30:
-                advice.append("It’s quite hot, ensure your dog stays hydrated and avoid long walks in the afternoon.")
-            elif temp < 10:
-                advice.append("It’s cold, keep your dog warm and limit time outdoors.")
-    except:
-        pass
+    # Weather check (cached per normalized location)
+    weather = registry.get("location_provider").get_weather(location)
+    if weather:
+        temp = weather["temp"]
+        if temp > 30:
+            advice.append("It’s quite hot, ensure your dog stays hydrated and avoid long walks in the afternoon.")
+        elif temp < 10:
+            advice.append("It’s cold, keep your dog warm and limit time outdoors.")
 
     # Vets / local services (dummy now, can extend with Google Maps API)
     advice.append(f"You can also check local vets near {location} for professional support.")
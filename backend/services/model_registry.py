@@ -0,0 +1,124 @@
+# services/model_registry.py
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Opt-in: load and warm every registered model in the background at startup
+WARMUP_ON_STARTUP = os.getenv("MODEL_WARMUP", "0").lower() in ("1", "true", "yes")
+
+
+class _Entry:
+    def __init__(self, loader: Callable[[], Any], warmup: Optional[Callable[[Any], None]],
+                 required: bool = True):
+        self.loader = loader
+        self.warmup = warmup
+        self.required = required
+        self.lock = threading.Lock()
+        self.obj: Any = None
+        self.state = "not_loaded"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+
+
+class ModelRegistry:
+    """
+    Lazily constructs heavy resources (models, embeddings, API clients).
+
+    Services register a loader at import time, which is cheap, and call
+    `get(name)` when they first need the object. Loading happens once per
+    process, guarded per entry so unrelated models load in parallel.
+    Readiness only waits for `required` entries; an optional one that fails
+    leaves the worker ready but degraded.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._warmup_started: Optional[float] = None
+        self._warmup_finished: Optional[float] = None
+
+    def register(self, name: str, loader: Callable[[], Any],
+                 warmup: Optional[Callable[[Any], None]] = None, required: bool = True) -> None:
+        self._entries[name] = _Entry(loader, warmup, required)
+
+    def get(self, name: str) -> Any:
+        entry = self._entries[name]
+        if entry.state == "ready":
+            return entry.obj
+        with entry.lock:
+            if entry.state != "ready":
+                entry.state = "loading"
+                started = time.perf_counter()
+                try:
+                    entry.obj = entry.loader()
+                except Exception as e:
+                    entry.state = "failed"
+                    entry.error = str(e)
+                    raise
+                entry.load_seconds = round(time.perf_counter() - started, 3)
+                entry.error = None
+                entry.state = "ready"
+        return entry.obj
+
+    def override(self, name: str, obj: Any) -> None:
+        """Install a ready-made object (stubs in benchmarks, preloaded models)."""
+        entry = self._entries.setdefault(name, _Entry(lambda: obj, None))
+        with entry.lock:
+            entry.obj = obj
+            entry.state = "ready"
+
+    def warmup(self, names: Optional[Iterable[str]] = None) -> None:
+        """Load each model and run its dummy inference; failures are recorded, not raised."""
+        self._warmup_started = time.time()
+        for name in list(names or self._entries):
+            entry = self._entries[name]
+            try:
+                obj = self.get(name)
+                if entry.warmup is not None:
+                    started = time.perf_counter()
+                    entry.warmup(obj)
+                    entry.warmup_seconds = round(time.perf_counter() - started, 3)
+            except Exception as e:
+                entry.state = "failed"
+                entry.error = str(e)
+        self._warmup_finished = time.time()
+
+    def start_background_warmup(self) -> threading.Thread:
+        thread = threading.Thread(target=self.warmup, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self) -> bool:
+        # Without warmup, models load on first use and the worker is ready immediately
+        if not WARMUP_ON_STARTUP:
+            return True
+        return self._warmup_finished is not None and all(
+            e.state == "ready" for e in self._entries.values() if e.required
+        )
+
+    def degraded(self) -> List[str]:
+        """Optional entries that failed to load; their features fall back or stay off."""
+        return [name for name, e in self._entries.items() if not e.required and e.state == "failed"]
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.is_ready(),
+            "degraded": self.degraded(),
+            "warmup_enabled": WARMUP_ON_STARTUP,
+            "warmup_started_at": self._warmup_started,
+            "warmup_finished_at": self._warmup_finished,
+            "models": {
+                name: {
+                    "state": e.state,
+                    "required": e.required,
+                    "load_seconds": e.load_seconds,
+                    "warmup_seconds": e.warmup_seconds,
+                    "error": e.error,
+                }
+                for name, e in self._entries.items()
+            },
+        }
+
+
+registry = ModelRegistry()
@@ -0,0 +1,343 @@
+# services/profiling.py
+import os
+import re
+import sys
+import time
+import hmac
+import json
+import pstats
+import asyncio
+import cProfile
+import functools
+import threading
+import tracemalloc
+import contextvars
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+
+from services.storage import DATA_DIR
+
+# Off by default; when off nothing below is installed into the app
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes")
+# Required in the X-Profiling-Token header for every profiling request
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_DIR = os.getenv("PROFILING_DIR", os.path.join(DATA_DIR, "profiles"))
+# Upper bound for one whole-process sampling run
+PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", "60"))
+PROFILING_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "5"))
+
+TOKEN_HEADER = "x-profiling-token"
+TRIGGER_HEADER = "x-profile"
+FILE_HEADER = "x-profile-file"
+
+
+class ProfilerBusy(RuntimeError):
+    """Another capture of the same kind is already running."""
+
+
+def token_ok(token: Optional[str]) -> bool:
+    return bool(PROFILING_TOKEN) and token is not None and hmac.compare_digest(token, PROFILING_TOKEN)
+
+
+def _out_path(kind: str, label: str, ext: str) -> str:
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", label).strip("_")[:60] or "all"
+    now = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"{now % 1:.3f}"[1:]
+    return os.path.join(PROFILING_DIR, f"{kind}-{stamp}-{slug}.{ext}")
+
+
+def list_outputs() -> List[Dict[str, Any]]:
+    if not os.path.isdir(PROFILING_DIR):
+        return []
+    files = []
+    for name in sorted(os.listdir(PROFILING_DIR)):
+        path = os.path.join(PROFILING_DIR, name)
+        if os.path.isfile(path):
+            files.append({"name": name, "bytes": os.path.getsize(path), "modified": os.path.getmtime(path)})
+    return files
+
+
+def output_path(name: str) -> Optional[str]:
+    """Path of an existing output file; None for unknown names or anything outside PROFILING_DIR."""
+    if os.path.basename(name) != name or name.startswith("."):
+        return None
+    path = os.path.join(PROFILING_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+# ---- per-request cProfile ----
+# Profiles collected for the request being captured, shared with threadpool workers via the context
+_capture: "contextvars.ContextVar[Optional[List[cProfile.Profile]]]" = contextvars.ContextVar(
+    "profile_capture", default=None
+)
+# cProfile hooks the thread it runs on; overlapping captures would clobber each other
+_request_lock = threading.Lock()
+
+
+def profile_endpoint(fn: Callable) -> Callable:
+    """
+    Wrap an endpoint so it runs under cProfile while a request capture is
+    active, in whichever thread FastAPI runs it (event loop or threadpool).
+    Otherwise the wrapper is a single context-variable read.
+    """
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            profiles = _capture.get()
+            if profiles is None:
+                return await fn(*args, **kwargs)
+            prof = cProfile.Profile()
+            profiles.append(prof)
+            prof.enable()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                prof.disable()
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profiles = _capture.get()
+        if profiles is None:
+            return fn(*args, **kwargs)
+        prof = cProfile.Profile()
+        profiles.append(prof)
+        prof.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            prof.disable()
+    return wrapper
+
+
+def _write_request_profile(profiles: List[cProfile.Profile], path: str) -> None:
+    stats = pstats.Stats(profiles[0])
+    for prof in profiles[1:]:
+        stats.add(prof)
+    stats.dump_stats(path)
+    with open(os.path.splitext(path)[0] + ".txt", "w", encoding="utf-8") as fp:
+        pstats.Stats(path, stream=fp).sort_stats("cumulative").print_stats(60)
+
+
+class ProfileRequestMiddleware:
+    """
+    Profiles one request when it carries `X-Profile: 1` (or `?profile=1`)
+    plus a valid `X-Profiling-Token`. Once they are written, the response
+    gets an `X-Profile-File` header naming the .prof (pstats, e.g. for
+    snakeviz) and .txt summary in PROFILING_DIR. Only the endpoint function is profiled:
+    for async endpoints that includes whatever else the event loop runs
+    while it awaits, and a streamed response body is not covered.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _requested(scope) -> Optional[str]:
+        headers = dict(scope.get("headers") or [])
+        flag = headers.get(TRIGGER_HEADER.encode(), b"").decode("latin-1")
+        if not flag and b"profile=" in scope.get("query_string", b""):
+            flag = parse_qs(scope["query_string"].decode("latin-1")).get("profile", [""])[0]
+        if flag.lower() not in ("1", "true", "yes"):
+            return None
+        return headers.get(TOKEN_HEADER.encode(), b"").decode("latin-1")
+
+    async def _reject(self, send, status: int, detail: str) -> None:
+        body = json.dumps({"detail": detail}).encode()
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = self._requested(scope)
+        if token is None:
+            await self.app(scope, receive, send)
+            return
+        if not token_ok(token):
+            await self._reject(send, 403, "Invalid profiling token")
+            return
+        if not _request_lock.acquire(blocking=False):
+            await self._reject(send, 409, "Another request is being profiled")
+            return
+
+        path = _out_path("request", f"{scope['method']}-{scope['path']}", "prof")
+        profiles: List[cProfile.Profile] = []
+        written = False
+        ctx_token = _capture.set(profiles)
+
+        async def send_wrapper(message):
+            nonlocal written
+            # The endpoint has returned by the time the response starts; only
+            # name a file in the header once it is actually on disk
+            if message["type"] == "http.response.start" and profiles:
+                written = True
+                try:
+                    _write_request_profile(profiles, path)
+                except Exception as e:
+                    print("Could not write request profile:", e)
+                else:
+                    headers = list(message.get("headers", []))
+                    headers.append((FILE_HEADER.encode(), os.path.basename(path).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _capture.reset(ctx_token)
+            try:
+                # No response was started (e.g. the endpoint raised): still keep the profile
+                if profiles and not written:
+                    _write_request_profile(profiles, path)
+            finally:
+                _request_lock.release()
+
+
+# ---- whole-process sampling ----
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class StackSampler:
+    """
+    Wall-clock sampler over every thread: walks `sys._current_frames()`
+    each interval and writes collapsed stacks ("thread;outer;...;inner count"),
+    the input format of flamegraph.pl and speedscope. Threads blocked in
+    waits show up too, which is usually what a latency spike needs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def run(self, seconds: float, interval_ms: float = PROFILING_SAMPLE_INTERVAL_MS) -> Dict[str, Any]:
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A sampling run is already in progress")
+        try:
+            me = threading.get_ident()
+            interval = max(0.001, interval_ms / 1000.0)
+            stacks: Counter = Counter()
+            samples = 0
+            started = time.perf_counter()
+            deadline = started + seconds
+            while time.perf_counter() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_name(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, f"thread-{ident}").replace(";", ":").replace(" ", "_"))
+                    stacks[";".join(reversed(stack))] += 1
+                samples += 1
+                time.sleep(interval)
+            elapsed = time.perf_counter() - started
+        finally:
+            self._lock.release()
+
+        path = _out_path("sample", f"{int(seconds)}s", "collapsed")
+        with open(path, "w", encoding="utf-8") as fp:
+            for stack, count in stacks.most_common():
+                fp.write(f"{stack} {count}\n")
+        return {
+            "file": os.path.basename(path),
+            "seconds": round(elapsed, 2),
+            "samples": samples,
+            "unique_stacks": len(stacks),
+        }
+
+
+# ---- tracemalloc ----
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+STAT_KEYS = ("lineno", "filename", "traceback")
+
+
+def _stat_row(stat) -> Dict[str, Any]:
+    row = {
+        "where": [str(f) for f in stat.traceback] if len(stat.traceback) > 1 else str(stat.traceback[0]),
+        "size_kib": round(stat.size / 1024, 1),
+        "count": stat.count,
+    }
+    if hasattr(stat, "size_diff"):
+        row["size_diff_kib"] = round(stat.size_diff / 1024, 1)
+        row["count_diff"] = stat.count_diff
+    return row
+
+
+class MemoryTracker:
+    """
+    tracemalloc control: start tracing, take snapshots (dumped to
+    PROFILING_DIR and diffed against the previous one) and diff any two
+    saved snapshots. Tracing slows allocations noticeably, so it only runs
+    between start() and stop().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last: Optional[tracemalloc.Snapshot] = None
+        self._last_file: Optional[str] = None
+
+    def status(self) -> Dict[str, Any]:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else None,
+            "traced_kib": round(current / 1024, 1),
+            "peak_kib": round(peak / 1024, 1),
+            "last_snapshot": self._last_file,
+        }
+
+    def start(self, frames: int = 25) -> Dict[str, Any]:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(max(1, frames))
+                self._last, self._last_file = None, None
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        with self._lock:
+            tracemalloc.stop()
+            self._last, self._last_file = None, None
+        return self.status()
+
+    def snapshot(self, limit: int = 20, key: str = "lineno") -> Dict[str, Any]:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc is not running; start it first")
+            snap = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+            path = _out_path("tracemalloc", "snapshot", "snap")
+            snap.dump(path)
+            previous, previous_file = self._last, self._last_file
+            self._last, self._last_file = snap, os.path.basename(path)
+        result = {
+            "file": os.path.basename(path),
+            "top": [_stat_row(s) for s in snap.statistics(key)[:limit]],
+            "diff_against": previous_file,
+            "diff": None,
+        }
+        if previous is not None:
+            result["diff"] = [_stat_row(s) for s in snap.compare_to(previous, key)[:limit]]
+        return result
+
+    @staticmethod
+    def diff_files(base_path: str, new_path: str, limit: int = 20, key: str = "lineno") -> List[Dict[str, Any]]:
+        base = tracemalloc.Snapshot.load(base_path)
+        new = tracemalloc.Snapshot.load(new_path)
+        return [_stat_row(s) for s in new.compare_to(base, key)[:limit]]
+
+
+sampler = StackSampler()
+memory = MemoryTracker()
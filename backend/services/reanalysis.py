@@ -0,0 +1,294 @@
+# services/reanalysis.py
+"""
+Offline re-analysis of stored images, e.g. after changing image_service
+thresholds or swapping the dog vision model.
+
+Images come from uploaded_images/ (or the images registry) and are scored
+by a pool of worker processes, each loading the model once and running
+batched forward passes with one torch thread, so N workers use N cores.
+Results are written as columnar NPZ (or Parquet, with pyarrow) parts in
+the output directory; a checkpoint records finished parts so an
+interrupted run resumes where it stopped.
+
+    python -m services.reanalysis --out data/reanalysis/2025-09-01
+    python -m services.reanalysis --source registry --workers 8 --batch-size 32
+"""
+import os
+import sys
+import glob
+import json
+import time
+import ntpath
+import argparse
+import multiprocessing
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from services.storage import DATA_DIR, UPLOAD_DIR
+
+REANALYSIS_DIR = os.path.join(DATA_DIR, "reanalysis")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tiff")
+CHECKPOINT_FILE = "checkpoint.json"
+
+# Output columns, in order
+COLUMNS = (
+    "path", "error", "is_dog", "label", "confidence", "breed", "breed_confidence",
+    "brightness", "clarity", "color_balance",
+)
+
+
+# ---- inputs ----
+def iter_directory(image_dir: str) -> Iterator[str]:
+    for path in sorted(glob.glob(os.path.join(image_dir, "*"))):
+        if path.lower().endswith(IMAGE_EXTS):
+            yield path
+
+
+def iter_registry() -> Iterator[str]:
+    """Registered image paths; paths recorded on another machine fall back to UPLOAD_DIR."""
+    from services.storage import iter_images
+
+    for item in iter_images():
+        path = item.get("path") or ""
+        if not os.path.exists(path):
+            path = os.path.join(UPLOAD_DIR, ntpath.basename(path) or item.get("filename", ""))
+        yield path
+
+
+def _chunks(paths: Iterator[str], size: int) -> Iterator[List[str]]:
+    chunk: List[str] = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ---- worker process ----
+def _init_worker(torch_threads: int) -> None:
+    import torch
+    from services import dog_vision
+
+    torch.set_num_threads(torch_threads)
+    dog_vision._load_model()
+
+
+def _empty_row(path: str, error: str) -> Dict[str, Any]:
+    return {
+        "path": path, "error": error, "is_dog": False, "label": "", "confidence": np.nan,
+        "breed": "", "breed_confidence": np.nan,
+        "brightness": np.nan, "clarity": np.nan, "color_balance": np.nan,
+    }
+
+
+def analyze_chunk(paths: List[str], threshold: float, top_k: int) -> List[Dict[str, Any]]:
+    """Decode, score quality and run one batched forward pass for a chunk of files."""
+    from services import dog_vision
+    from services.image_service import analyze_image_array, decode_image
+
+    rows: List[Optional[Dict[str, Any]]] = [None] * len(paths)
+    imgs, idx = [], []
+    for i, path in enumerate(paths):
+        try:
+            with open(path, "rb") as fp:
+                img = decode_image(fp.read())
+            brightness, clarity, color_balance, _, _ = analyze_image_array(img)
+        except Exception as e:
+            rows[i] = _empty_row(path, f"{type(e).__name__}: {e}")
+            continue
+        rows[i] = {
+            **_empty_row(path, ""),
+            "brightness": brightness, "clarity": clarity, "color_balance": color_balance,
+        }
+        imgs.append(img)
+        idx.append(i)
+
+    if imgs:
+        for i, result in zip(idx, dog_vision.analyze_batch(imgs, threshold, top_k)):
+            rows[i].update(
+                is_dog=result.is_dog, label=result.label, confidence=result.confidence,
+                breed=result.breed, breed_confidence=result.breed_confidence,
+            )
+    return rows
+
+
+# ---- output ----
+def _columns(rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    cols = {}
+    for name in COLUMNS:
+        values = [r[name] for r in rows]
+        if name in ("path", "error", "label", "breed"):
+            cols[name] = np.array(values, dtype=str)
+        elif name == "is_dog":
+            cols[name] = np.array(values, dtype=bool)
+        else:
+            cols[name] = np.array(values, dtype=np.float32)
+    return cols
+
+
+def _write_part(out_dir: str, part: int, rows: List[Dict[str, Any]], fmt: str) -> str:
+    cols = _columns(rows)
+    name = f"part-{part:05d}.{fmt}"
+    tmp = os.path.join(out_dir, f".{name}.tmp")
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        pq.write_table(pa.table(cols), tmp)
+    else:
+        with open(tmp, "wb") as fp:
+            np.savez_compressed(fp, **cols)
+    os.replace(tmp, os.path.join(out_dir, name))
+    return name
+
+
+def _load_checkpoint(out_dir: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def load_results(out_dir: str) -> Dict[str, np.ndarray]:
+    """Concatenate the NPZ parts the run's checkpoint lists into one set of columns."""
+    checkpoint = _load_checkpoint(out_dir) or {}
+    cols: Dict[str, List[np.ndarray]] = {c: [] for c in COLUMNS}
+    for name in checkpoint.get("parts", []):
+        if not name.endswith(".npz"):
+            continue
+        with np.load(os.path.join(out_dir, name), allow_pickle=False) as d:
+            for c in COLUMNS:
+                cols[c].append(d[c])
+    return {c: np.concatenate(v) if v else np.array([]) for c, v in cols.items()}
+
+
+def _clear_parts(out_dir: str) -> None:
+    """Remove a previous run's parts (and half-written temp files) before starting over."""
+    for path in glob.glob(os.path.join(out_dir, "part-*")) + glob.glob(os.path.join(out_dir, ".part-*.tmp")):
+        os.remove(path)
+    if os.path.exists(os.path.join(out_dir, CHECKPOINT_FILE)):
+        os.remove(os.path.join(out_dir, CHECKPOINT_FILE))
+
+
+def _done_paths(out_dir: str, checkpoint: Dict[str, Any]) -> set:
+    done = set()
+    for name in checkpoint.get("parts", []):
+        path = os.path.join(out_dir, name)
+        if name.endswith(".parquet"):
+            import pyarrow.parquet as pq
+
+            done.update(pq.read_table(path, columns=["path"]).column("path").to_pylist())
+        else:
+            with np.load(path, allow_pickle=False) as d:
+                done.update(d["path"].tolist())
+    return done
+
+
+def _save_checkpoint(out_dir: str, checkpoint: Dict[str, Any]) -> None:
+    tmp = os.path.join(out_dir, CHECKPOINT_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fp:
+        json.dump(checkpoint, fp, indent=2)
+    os.replace(tmp, os.path.join(out_dir, CHECKPOINT_FILE))
+
+
+# ---- driver ----
+def run(paths: Iterator[str], out_dir: str, workers: int, batch_size: int, part_size: int,
+        threshold: float, top_k: int, fmt: str = "npz", restart: bool = False,
+        log=print) -> Dict[str, Any]:
+    from services.dog_vision import MODEL_TAG
+    from services.image_service import ANALYSIS_VERSION
+
+    os.makedirs(out_dir, exist_ok=True)
+    config = {"model_tag": MODEL_TAG, "analysis_version": ANALYSIS_VERSION,
+              "threshold": threshold, "top_k": top_k, "format": fmt}
+    checkpoint = {"config": config, "parts": [], "images": 0}
+    if restart:
+        # Part names restart at 00000; stale parts would otherwise mix into the results
+        _clear_parts(out_dir)
+    else:
+        previous = _load_checkpoint(out_dir)
+        if previous is not None:
+            if previous.get("config") != config:
+                raise SystemExit(f"{out_dir} was produced with {previous.get('config')}; "
+                                 "use a new --out or --restart")
+            checkpoint = previous
+
+    done = _done_paths(out_dir, checkpoint)
+    if done:
+        log(f"resuming: {len(done)} images already in {len(checkpoint['parts'])} parts")
+    todo = (p for p in paths if p not in done)
+
+    # One torch thread per process; the processes provide the parallelism
+    ctx = multiprocessing.get_context("spawn")
+    started = time.perf_counter()
+    processed = 0
+    buffer: List[Dict[str, Any]] = []
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(1,)) as pool:
+        # Bounded window of chunks in flight, consumed in input order, so
+        # memory doesn't grow with the corpus
+        window: "deque" = deque()
+        chunks = _chunks(todo, batch_size)
+        while True:
+            for chunk in chunks:
+                window.append(pool.apply_async(analyze_chunk, (chunk, threshold, top_k)))
+                if len(window) >= workers * 2:
+                    break
+            if not window:
+                break
+            rows = window.popleft().get()
+            buffer.extend(rows)
+            processed += len(rows)
+            if len(buffer) >= part_size:
+                _flush(out_dir, checkpoint, buffer, fmt)
+                buffer = []
+                elapsed = time.perf_counter() - started
+                log(f"{checkpoint['images']} images total, {processed / elapsed:.1f} images/sec")
+        if buffer:
+            _flush(out_dir, checkpoint, buffer, fmt)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "out_dir": out_dir,
+        "processed": processed,
+        "total_images": checkpoint["images"],
+        "parts": len(checkpoint["parts"]),
+        "seconds": round(elapsed, 2),
+        "images_per_sec": round(processed / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
+def _flush(out_dir: str, checkpoint: Dict[str, Any], rows: List[Dict[str, Any]], fmt: str) -> None:
+    checkpoint["parts"].append(_write_part(out_dir, len(checkpoint["parts"]), rows, fmt))
+    checkpoint["images"] += len(rows)
+    _save_checkpoint(out_dir, checkpoint)
+
+
+if __name__ == "__main__":
+    from services.dog_vision import DOG_THRESHOLD, TOP_K
+
+    parser = argparse.ArgumentParser(description="Re-run image analysis over stored uploads.")
+    parser.add_argument("--source", choices=["dir", "registry"], default="dir")
+    parser.add_argument("--dir", default=UPLOAD_DIR, help="image folder for --source dir")
+    parser.add_argument("--out", default=os.path.join(REANALYSIS_DIR, time.strftime("%Y%m%d-%H%M%S")))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=32, help="images per forward pass")
+    parser.add_argument("--part-size", type=int, default=4096, help="images per output part / checkpoint")
+    parser.add_argument("--threshold", type=float, default=DOG_THRESHOLD)
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--format", choices=["npz", "parquet"], default="npz")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint in --out")
+    args = parser.parse_args()
+
+    source = iter_directory(args.dir) if args.source == "dir" else iter_registry()
+    if args.limit:
+        source = (p for i, p in zip(range(args.limit), source))
+    summary = run(source, args.out, max(1, args.workers), args.batch_size, args.part_size,
+                  args.threshold, args.top_k, args.format, args.restart,
+                  log=lambda msg: print(msg, file=sys.stderr))
+    print(json.dumps(summary))
@@ -0,0 +1,184 @@
+# services/report_jobs.py
+import os
+import time
+import uuid
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+from services.storage import register_report
+
+# Report rendering processes; PDFs never render on an API worker
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+# Finished jobs remembered for status polling
+REPORT_JOB_HISTORY = int(os.getenv("REPORT_JOB_HISTORY", "1000"))
+
+
+def render_report(session_id: str, data: Dict[str, Any], fingerprint: Optional[str] = None) -> str:
+    """Runs in a worker process."""
+    from services.report_service import create_session_report_pdf
+    return create_session_report_pdf(session_id, data, fingerprint)
+
+
+class ReportJobQueue:
+    """
+    Renders session reports in a process pool and tracks them by job id.
+
+    `submit()` returns immediately with a job dict; `get()` reports
+    queued / running / done (with `report_url`) / failed. A session that
+    already has a job for the same fingerprint gets that job back instead
+    of a second render. Renders of one session never overlap: a request
+    with newer content while one is running becomes a single follow-up
+    job, updated in place by later requests, that starts when it
+    finishes. Workers use the "spawn" start method so they never inherit
+    locks held by this process's threads.
+    """
+
+    def __init__(self, workers: int = REPORT_WORKERS, history: int = REPORT_JOB_HISTORY):
+        self.workers = max(1, workers)
+        self.history = history
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._futures: Dict[str, Future] = {}
+        self._active: Dict[str, str] = {}  # session_id -> job_id while queued/running
+        self._followup: Dict[str, tuple] = {}  # session_id -> (job_id, data) waiting on the active job
+        self._stats = {"submitted": 0, "deduplicated": 0, "done": 0, "failed": 0}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # self._lock held; processes start on first use, not at import
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _view(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        # self._lock held
+        view = dict(job)
+        future = self._futures.get(job["job_id"])
+        if view["status"] == "queued" and future is not None and future.running():
+            view["status"] = "running"
+        return view
+
+    def _new_job(self, session_id: str, fingerprint: Optional[str]) -> Dict[str, Any]:
+        # self._lock held
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "session_id": session_id,
+            "fingerprint": fingerprint,
+            "status": "queued",
+            "submitted_at": time.time(),
+            "finished_at": None,
+            "report_url": None,
+            "error": None,
+        }
+        self._jobs[job["job_id"]] = job
+        self._stats["submitted"] += 1
+        return job
+
+    def _start(self, job: Dict[str, Any], data: Dict[str, Any]) -> Future:
+        # self._lock held
+        args = (render_report, job["session_id"], data, job["fingerprint"])
+        try:
+            future = self._pool().submit(*args)
+        except BrokenProcessPool:
+            # A worker died earlier (e.g. OOM); start a fresh pool
+            self._executor = None
+            future = self._pool().submit(*args)
+        self._active[job["session_id"]] = job["job_id"]
+        self._futures[job["job_id"]] = future
+        return future
+
+    def _watch(self, job_id: str, future: Future) -> None:
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+
+    def submit(self, session_id: str, data: Dict[str, Any],
+               fingerprint: Optional[str] = None) -> Dict[str, Any]:
+        future = None
+        with self._lock:
+            active_id = self._active.get(session_id)
+            followup = self._followup.get(session_id)
+            for job_id in (active_id, followup[0] if followup else None):
+                if job_id is not None and self._jobs[job_id]["fingerprint"] == fingerprint:
+                    self._stats["deduplicated"] += 1
+                    return self._view(self._jobs[job_id])
+            if followup is not None:
+                # Not started yet: render the newer content under the same job id
+                job = self._jobs[followup[0]]
+                job["fingerprint"] = fingerprint
+                self._followup[session_id] = (job["job_id"], data)
+                self._stats["deduplicated"] += 1
+                return self._view(job)
+            job = self._new_job(session_id, fingerprint)
+            if active_id is None:
+                future = self._start(job, data)
+            else:
+                self._followup[session_id] = (job["job_id"], data)
+            view = self._view(job)
+        if future is not None:
+            self._watch(job["job_id"], future)
+        return view
+
+    def _finish(self, job_id: str, future: Future) -> None:
+        try:
+            pdf_path = future.result()
+            filename = os.path.basename(pdf_path)
+            register_report(filename)
+            update = {"status": "done", "report_url": f"/reports/{filename}"}
+        except Exception as e:
+            update = {"status": "failed", "error": str(e) or type(e).__name__}
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(update, finished_at=time.time())
+            self._stats[update["status"]] += 1
+            self._futures.pop(job_id, None)
+            session_id = job["session_id"]
+            if self._active.get(session_id) == job_id:
+                del self._active[session_id]
+            next_job, next_future = None, None
+            followup = self._followup.pop(session_id, None)
+            if followup is not None:
+                next_job = self._jobs[followup[0]]
+                try:
+                    next_future = self._start(next_job, followup[1])
+                except Exception as e:
+                    next_job.update(status="failed", error=str(e), finished_at=time.time())
+                    self._stats["failed"] += 1
+            # Forget the oldest finished jobs
+            while len(self._jobs) > self.history:
+                oldest = next(iter(self._jobs))
+                if self._jobs[oldest]["finished_at"] is None:
+                    break
+                del self._jobs[oldest]
+        if next_future is not None:
+            self._watch(next_job["job_id"], next_future)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._view(job) if job is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "workers": self.workers,
+                "active": len(self._active),
+                "followups": len(self._followup),
+                "tracked": len(self._jobs),
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+report_jobs = ReportJobQueue()
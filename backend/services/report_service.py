@@ -1,22 +1,41 @@
 import os
+import glob
+import json
+import hashlib
+import tempfile
+from functools import lru_cache
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import inch
-from typing import List, Dict
-from .storage import REPORT_DIR, register_report
+from reportlab.lib.utils import ImageReader
+from typing import List, Dict, Optional
+from .storage import DATA_DIR, REPORT_DIR, register_report
 from fastapi import HTTPException
-from services.dog_detector import is_dog_image
-from services.breed_classifier import predict_breed
 from services.health_advice import get_health_report
 
+# Bump whenever the PDF layout changes so cached reports are re-rendered
+REPORT_TEMPLATE_VERSION = 1
+# Sidecar {session_id}.json per cached PDF, outside the public /reports mount
+REPORT_META_DIR = os.path.join(DATA_DIR, "report_meta")
+# Image sections (derivative path + drawn size) kept per report worker process
+REPORT_IMAGE_CACHE_SIZE = int(os.getenv("REPORT_IMAGE_CACHE_SIZE", "128"))
+# Photos are embedded as JPEG derivatives at print resolution, not full size
+REPORT_IMAGE_DPI = int(os.getenv("REPORT_IMAGE_DPI", "150"))
+REPORT_IMAGE_QUALITY = int(os.getenv("REPORT_IMAGE_QUALITY", "80"))
+REPORT_IMAGE_DIR = os.path.join(DATA_DIR, "report_images")
+# Largest box an image is drawn into
+REPORT_IMAGE_BOX = 3*inch
+
 
 def analyze_dog_image(image_path: str) -> dict:
-    # Step 1: Detect dog
-    if not is_dog_image(image_path):
-        raise HTTPException(status_code=400, detail="No dog detected in image")
+    # Imported here so report worker processes never load the vision model
+    from services.dog_vision import analyze as analyze_dog
 
-    # Step 2: Predict breed (now includes confidence)
-    breed, confidence = predict_breed(image_path)
+    # Step 1 + 2: Detect dog and predict breed from a single forward pass
+    result = analyze_dog(image_path)
+    if not result.is_dog:
+        raise HTTPException(status_code=400, detail="No dog detected in image")
+    breed, confidence = result.breed, result.breed_confidence
 
     # Step 3: Generate health report
     report = get_health_report(breed)
@@ -28,15 +47,130 @@ def analyze_dog_image(image_path: str) -> dict:
     }
 
 
-def create_session_report_pdf(session_id: str, data: Dict) -> str:
+def _image_key(image_path: Optional[str]):
+    """(path, mtime, size) identifies one version of an image file; None if unreadable."""
+    if not image_path:
+        return None
+    try:
+        st = os.stat(image_path)
+    except OSError:
+        return None
+    return image_path, st.st_mtime_ns, st.st_size
+
+
+def session_fingerprint(data: Dict) -> str:
+    """
+    Hash of everything the PDF shows: chat history, image analyses, the
+    image files themselves (path, mtime, size), the embedding DPI/quality
+    and the template version.
+    """
+    images = []
+    for item in data.get("image_history") or []:
+        if isinstance(item, dict):
+            path = item.get("image_path") or item.get("filename")
+            images.append([_image_key(path), item.get("analysis", {})])
+    payload = json.dumps(
+        {"template": REPORT_TEMPLATE_VERSION, "dpi": REPORT_IMAGE_DPI, "quality": REPORT_IMAGE_QUALITY,
+         "chat": data.get("chat_history") or [], "images": images},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _meta_path(session_id: str) -> str:
+    return os.path.join(REPORT_META_DIR, f"{session_id}.json")
+
+
+def _read_meta(session_id: str) -> Dict:
+    try:
+        with open(_meta_path(session_id), "r", encoding="utf-8") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def report_filename(session_id: str, fingerprint: Optional[str] = None) -> str:
+    """
+    Each rendered version of a session's report gets its own name, so a URL
+    handed out for one fingerprint never serves the PDF of another.
+    """
+    if fingerprint is None:
+        return f"{session_id}.pdf"
+    return f"{session_id}-{fingerprint[:16]}.pdf"
+
+
+def cached_report(session_id: str, fingerprint: str) -> Optional[str]:
+    """Path of the session's PDF if it was rendered from exactly this content."""
+    meta = _read_meta(session_id)
+    if meta.get("fingerprint") != fingerprint:
+        return None
+    pdf_path = os.path.join(REPORT_DIR, meta.get("filename") or report_filename(session_id, fingerprint))
+    return pdf_path if os.path.exists(pdf_path) else None
+
+
+def _derivative(image_path: str, mtime_ns: int, size: int):
+    """
+    Downscale to what a REPORT_IMAGE_BOX at REPORT_IMAGE_DPI can show and
+    save as JPEG under data/report_images/, reusing an existing file.
+    Files are named {image}-{version}.jpg; writing a new version of an
+    image removes the older ones, so edits and re-uploads leave nothing behind.
+    Returns (jpeg path, drawn width, drawn height) in points.
+    """
+    from PIL import Image
+
+    image_id = hashlib.sha1(image_path.encode("utf-8")).hexdigest()
+    version = hashlib.sha1(
+        f"{mtime_ns}|{size}|{REPORT_IMAGE_DPI}|{REPORT_IMAGE_QUALITY}".encode("utf-8")
+    ).hexdigest()[:16]
+    out_path = os.path.join(REPORT_IMAGE_DIR, f"{image_id}-{version}.jpg")
+    with Image.open(image_path) as im:
+        # 1 px = 1 pt at draw time, as before; never upscale
+        iw, ih = im.size
+        scale = min(REPORT_IMAGE_BOX/iw, REPORT_IMAGE_BOX/ih, 1.0)
+        dw, dh = iw*scale, ih*scale
+        if not os.path.exists(out_path):
+            max_px = (max(1, round(dw / 72 * REPORT_IMAGE_DPI)), max(1, round(dh / 72 * REPORT_IMAGE_DPI)))
+            im.draft("RGB", max_px)  # let the JPEG decoder skip detail we would throw away
+            im = im.convert("RGB")
+            if im.width > max_px[0] or im.height > max_px[1]:
+                im = im.resize(max_px, Image.LANCZOS)
+            os.makedirs(REPORT_IMAGE_DIR, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=REPORT_IMAGE_DIR, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fp:
+                im.save(fp, "JPEG", quality=REPORT_IMAGE_QUALITY, optimize=True)
+            os.replace(tmp, out_path)
+            for old in glob.glob(os.path.join(REPORT_IMAGE_DIR, f"{image_id}-*.jpg")):
+                if old != out_path:
+                    try:
+                        os.remove(old)
+                    except OSError:
+                        pass
+    return out_path, dw, dh
+
+
+@lru_cache(maxsize=REPORT_IMAGE_CACHE_SIZE)
+def _image_section(image_path: str, mtime_ns: int, size: int):
+    """
+    Print-resolution JPEG for one image plus its drawn size, cached per
+    (path, mtime, size) so re-rendering a session after a new chat doesn't
+    open every photo again. ReportLab embeds the JPEG bytes as-is.
+    """
+    return _derivative(image_path, mtime_ns, size)
+
+
+def create_session_report_pdf(session_id: str, data: Dict, fingerprint: Optional[str] = None) -> str:
     """
     Generate a PDF report for a single session safely,
     handling different chat history formats.
+    The PDF is written via temp file + rename; when `fingerprint` is
+    given it is part of the file name and recorded in the sidecar for
+    cached_report(), and the previous version is removed.
     """
-    filename = f"{session_id}.pdf"
+    filename = report_filename(session_id, fingerprint)
     filepath = os.path.join(REPORT_DIR, filename)
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
 
-    c = canvas.Canvas(filepath, pagesize=A4)
+    c = canvas.Canvas(tmp_path, pagesize=A4)
     w, h = A4
     y = h - 72
 
@@ -59,17 +193,10 @@ def create_session_report_pdf(session_id: str, data: Dict) -> str:
             # ✅ fallback: use image_path if present, else filename
             image_path = item.get("image_path") or item.get("filename")
 
-            if image_path and os.path.exists(image_path):
+            key = _image_key(image_path)
+            if key is not None:
                 try:
-                    from reportlab.platypus import Image as RLImage
-                    from reportlab.platypus import SimpleDocTemplate, Spacer
-                    from reportlab.lib.utils import ImageReader
-
-                    img = ImageReader(image_path)
-                    iw, ih = img.getSize()
-                    max_width, max_height = 3*inch, 3*inch
-                    scale = min(max_width/iw, max_height/ih, 1.0)
-                    iw, ih = iw*scale, ih*scale
+                    img, iw, ih = _image_section(*key)
 
                     if y - ih < 100:  # new page if not enough space
                         c.showPage()
@@ -132,6 +259,24 @@ def create_session_report_pdf(session_id: str, data: Dict) -> str:
 
     c.showPage()
     c.save()
+    os.replace(tmp_path, filepath)
+
+    if fingerprint is not None:
+        meta = _read_meta(session_id)
+        # Sidecars written before reports were versioned don't name their file
+        previous = meta.get("filename") or (f"{session_id}.pdf" if meta else None)
+        os.makedirs(REPORT_META_DIR, exist_ok=True)
+        meta_path = _meta_path(session_id)
+        with open(f"{meta_path}.{os.getpid()}.tmp", "w", encoding="utf-8") as fp:
+            json.dump({"fingerprint": fingerprint, "filename": filename,
+                       "template": REPORT_TEMPLATE_VERSION}, fp)
+        os.replace(f"{meta_path}.{os.getpid()}.tmp", meta_path)
+        # The superseded version no longer matches the session; don't keep serving it
+        if previous and previous != filename:
+            try:
+                os.remove(os.path.join(REPORT_DIR, previous))
+            except OSError:
+                pass
     return filepath
 
 
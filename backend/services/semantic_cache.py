@@ -0,0 +1,200 @@
+# services/semantic_cache.py
+import os
+import re
+import json
+import time
+import atexit
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from services.metrics import CACHE_REQUESTS
+from services.storage import DATA_DIR
+
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", os.path.join(DATA_DIR, "semantic_cache.npz"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+SEMANTIC_CACHE_SAVE_INTERVAL = float(os.getenv("SEMANTIC_CACHE_SAVE_INTERVAL", "30"))
+
+# Follow-ups like "is it safe for him?" only make sense with the earlier turns
+_CONTEXT_WORDS = {
+    "it", "its", "it's", "this", "that", "these", "those", "they", "them", "their",
+    "he", "him", "his", "she", "her", "same", "again", "also", "else", "more",
+    "above", "previous", "earlier", "instead", "then",
+}
+_WORD_RE = re.compile(r"[a-z']+")
+
+
+def is_context_dependent(question: str, history: Optional[List[Dict[str, Any]]]) -> bool:
+    if not history:
+        return False
+    words = _WORD_RE.findall(question.lower())
+    return len(words) < 4 or any(w in _CONTEXT_WORDS for w in words)
+
+
+class SemanticCache:
+    """
+    Answers keyed by question embedding rather than exact text.
+
+    A lookup embeds the question and returns the stored answer of the most
+    similar previous question (cosine >= threshold) in the same namespace
+    (e.g. the user's location). Entries expire after `ttl`, the least
+    recently used go first once `max_entries` is exceeded, and the cache is
+    written to disk at most every `save_interval` seconds and on exit.
+    The file records the encoder `model` and embedding size; a cache written
+    by another encoder is dropped instead of compared against a different
+    vector space.
+    """
+
+    def __init__(self, encode: Callable[[str], np.ndarray], model: str = "", path: str = SEMANTIC_CACHE_PATH,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+                 ttl: float = SEMANTIC_CACHE_TTL_SECONDS, save_interval: float = SEMANTIC_CACHE_SAVE_INTERVAL):
+        self._encode = encode
+        self.model = model
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._embeddings: Optional[np.ndarray] = None
+        self._dirty = False
+        self._last_save = time.time()
+        self._stats = {"hits": 0, "misses": 0, "bypasses": 0, "evictions": 0}
+        self._saved_seconds = 0.0
+        self._llm_latency_ema: Optional[float] = None
+        self._load()
+        atexit.register(self.save)
+
+    # ---- persistence ----
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                model = str(data["model"]) if "model" in data else None
+                embeddings = data["embeddings"].astype(np.float32)
+                entries = json.loads(str(data["entries"]))
+        except Exception as e:
+            print("Ignoring unreadable semantic cache:", e)
+            return
+        if model != self.model:
+            print(f"Dropping semantic cache written by encoder {model!r}, now using {self.model!r}")
+            return
+        if len(entries) == len(embeddings):
+            self._entries, self._embeddings = entries, embeddings
+            self._expire(time.time())
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            embeddings = self._embeddings if self._embeddings is not None else np.zeros((0, 0), np.float32)
+            entries = json.dumps(self._entries, ensure_ascii=False)
+            self._dirty = False
+            self._last_save = time.time()
+        tmp = self.path + ".tmp.npz"
+        np.savez(tmp, embeddings=embeddings, entries=np.array(entries), model=np.array(self.model))
+        os.replace(tmp, self.path)
+
+    # ---- housekeeping (lock held) ----
+    def _remove(self, idx: List[int]) -> None:
+        if not idx:
+            return
+        drop = set(idx)
+        self._entries = [e for i, e in enumerate(self._entries) if i not in drop]
+        self._embeddings = np.delete(self._embeddings, idx, axis=0)
+        self._dirty = True
+
+    def _expire(self, now: float) -> None:
+        self._remove([i for i, e in enumerate(self._entries) if now - e["created_at"] > self.ttl])
+
+    def _check_dim(self, vec: np.ndarray) -> None:
+        # Same model name but a different embedding size: the stored vectors are unusable
+        if self._entries and self._embeddings.shape[1] != vec.shape[-1]:
+            print(f"Dropping semantic cache: embeddings are {self._embeddings.shape[1]}-d, "
+                  f"the encoder now returns {vec.shape[-1]}-d")
+            self._remove(list(range(len(self._entries))))
+
+    # ---- API ----
+    def lookup(self, question: str, history: Optional[List[Dict[str, Any]]] = None,
+               namespace: str = "") -> Optional[str]:
+        if is_context_dependent(question, history):
+            with self._lock:
+                self._stats["bypasses"] += 1
+            CACHE_REQUESTS.inc(cache="semantic", result="bypass")
+            return None
+        vec = self._encode(question)
+        now = time.time()
+        with self._lock:
+            self._check_dim(vec)
+            best = -1
+            if self._entries:
+                sims = self._embeddings @ vec
+                for i in np.argsort(-sims):
+                    if sims[i] < self.threshold:
+                        break
+                    e = self._entries[i]
+                    if e["namespace"] == namespace and now - e["created_at"] <= self.ttl:
+                        best = int(i)
+                        break
+            if best < 0:
+                self._stats["misses"] += 1
+                CACHE_REQUESTS.inc(cache="semantic", result="miss")
+                return None
+            entry = self._entries[best]
+            entry["last_used"] = now
+            self._stats["hits"] += 1
+            CACHE_REQUESTS.inc(cache="semantic", result="hit")
+            if self._llm_latency_ema is not None:
+                self._saved_seconds += self._llm_latency_ema
+            return entry["answer"]
+
+    def store(self, question: str, answer: str, history: Optional[List[Dict[str, Any]]] = None,
+              namespace: str = "", latency_s: Optional[float] = None) -> None:
+        """Remember an LLM answer; `latency_s` feeds the saved-latency estimate."""
+        if latency_s is not None:
+            with self._lock:
+                ema = self._llm_latency_ema
+                self._llm_latency_ema = latency_s if ema is None else 0.9 * ema + 0.1 * latency_s
+        if is_context_dependent(question, history):
+            return
+        vec = self._encode(question).astype(np.float32).reshape(1, -1)
+        now = time.time()
+        with self._lock:
+            self._check_dim(vec)
+            self._entries.append({
+                "question": question,
+                "answer": answer,
+                "namespace": namespace,
+                "created_at": now,
+                "last_used": now,
+            })
+            self._embeddings = vec if self._embeddings is None or not len(self._embeddings) \
+                else np.vstack([self._embeddings, vec])
+            self._dirty = True
+            self._expire(now)
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                lru = sorted(range(len(self._entries)), key=lambda i: self._entries[i]["last_used"])
+                self._remove(lru[:overflow])
+                self._stats["evictions"] += overflow
+            due = now - self._last_save >= self.save_interval
+        if due:
+            self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "avg_llm_latency_ms": round(self._llm_latency_ema * 1000.0, 1)
+                if self._llm_latency_ema is not None else None,
+                "saved_seconds": round(self._saved_seconds, 3),
+            }
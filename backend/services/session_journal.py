@@ -0,0 +1,182 @@
+# services/session_journal.py
+import os
+import json
+import time
+import queue
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Appends are batched and fsynced by one writer thread at most every FLUSH_MS
+JOURNAL_FLUSH_MS = float(os.getenv("SESSION_JOURNAL_FLUSH_MS", "50"))
+# Rewrite a session's snapshot and truncate its journal after this many records
+JOURNAL_COMPACT_EVERY = int(os.getenv("SESSION_JOURNAL_COMPACT_EVERY", "200"))
+
+SEQ_KEY = "_journal_seq"
+
+
+def write_atomic(path: str, payload: str) -> None:
+    """Write via temp file + rename so readers never see a half-written file."""
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fp:
+        fp.write(payload)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp, path)
+
+
+class SessionJournal:
+    """
+    Write-behind, append-only event log with one JSONL file per session
+    ({id}.journal next to the {id}.json snapshot).
+
+    `append()` and `compact()` only enqueue; a single writer thread applies
+    them in order, writing every record queued during one flush window
+    with one fsync per touched file. Compaction writes the snapshot
+    atomically and then truncates the journal. The snapshot carries the
+    sequence number of the last record it contains, so a crash between
+    the two steps never replays a record twice.
+    """
+
+    def __init__(self, sessions_dir: str, flush_ms: float = JOURNAL_FLUSH_MS):
+        self.sessions_dir = sessions_dir
+        self.flush_interval = max(0.0, flush_ms) / 1000.0
+        self._queue: "queue.Queue[Tuple[str, str, Any]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._run, name="session-journal", daemon=True)
+        self._writer.start()
+
+    def journal_path(self, session_id: str) -> str:
+        return os.path.join(self.sessions_dir, f"{session_id}.journal")
+
+    def snapshot_path(self, session_id: str) -> str:
+        return os.path.join(self.sessions_dir, f"{session_id}.json")
+
+    # ---- producer side ----
+    def append(self, session_id: str, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        self._queue.put(("append", session_id, line))
+
+    def compact(self, session_id: str, snapshot_json: str, final: bool = False) -> None:
+        """Queue a snapshot rewrite; `final` deletes the journal instead of truncating it."""
+        self._queue.put(("compact", session_id, (snapshot_json, final)))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is on disk."""
+        if self._queue.unfinished_tasks == 0:
+            return True
+        done = threading.Event()
+        self._queue.put(("barrier", "", done))
+        return done.wait(timeout)
+
+    # ---- writer thread ----
+    def _drain(self) -> List[Tuple[str, str, Any]]:
+        batch = [self._queue.get()]
+        if self.flush_interval:
+            time.sleep(self.flush_interval)
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._drain()
+            pending: Dict[str, List[str]] = {}
+            try:
+                for op, session_id, payload in batch:
+                    if op == "append":
+                        pending.setdefault(session_id, []).append(payload)
+                        continue
+                    # Compactions and barriers must observe every earlier append
+                    self._write_pending(pending)
+                    pending = {}
+                    if op == "compact":
+                        self._compact(session_id, *payload)
+                    elif op == "barrier":
+                        payload.set()
+                self._write_pending(pending)
+            except Exception as e:
+                print("Session journal write failed:", e)
+                for op, _, payload in batch:
+                    if op == "barrier":
+                        payload.set()
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_pending(self, pending: Dict[str, List[str]]) -> None:
+        for session_id, lines in pending.items():
+            with open(self.journal_path(session_id), "a", encoding="utf-8") as fp:
+                fp.write("".join(lines))
+                fp.flush()
+                os.fsync(fp.fileno())
+
+    def _compact(self, session_id: str, snapshot_json: str, final: bool) -> None:
+        write_atomic(self.snapshot_path(session_id), snapshot_json)
+        path = self.journal_path(session_id)
+        if final:
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            open(path, "w").close()
+
+    # ---- recovery ----
+    def journaled_sessions(self) -> Iterator[str]:
+        for name in os.listdir(self.sessions_dir):
+            if name.endswith(".journal"):
+                yield name[: -len(".journal")]
+
+    def replay(self, session_id: str) -> Tuple[Optional[Dict[str, Any]], int, bool]:
+        """
+        Rebuild one session from its snapshot plus journal.
+        Returns (data or None, last sequence number, ended).
+        """
+        data: Optional[Dict[str, Any]] = None
+        seq = 0
+        snap = self.snapshot_path(session_id)
+        if os.path.exists(snap):
+            try:
+                with open(snap, "r", encoding="utf-8") as fp:
+                    data = json.load(fp)
+                seq = int(data.pop(SEQ_KEY, 0))
+            except Exception:
+                data = None
+
+        ended = False
+        path = self.journal_path(session_id)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fp:
+                for line in fp:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        break  # torn final line from a crash mid-append
+                    # A "create" starts a new incarnation of a re-used id, even
+                    # if the old final snapshot carries a higher seq
+                    if rec.get("seq", 0) <= seq and rec.get("op") != "create":
+                        continue
+                    seq = rec["seq"]
+                    data, ended = apply_record(data, rec, ended)
+        return data, seq, ended
+
+
+def apply_record(data: Optional[Dict[str, Any]], rec: Dict[str, Any], ended: bool = False):
+    """Apply one journal record to a session dict; returns (data, ended)."""
+    op = rec.get("op")
+    if op == "create":
+        # A re-created id starts over rather than extending an old final snapshot
+        return {"created_at": rec["created_at"], "chat_history": [], "image_history": []}, False
+    if data is None:
+        data = {"created_at": None, "chat_history": [], "image_history": []}
+    if op == "chat":
+        data["chat_history"].append({"role": rec["role"], "text": rec["text"]})
+    elif op == "image":
+        data["image_history"].append({
+            "filename": rec["filename"],
+            "image_path": rec["image_path"],
+            "analysis": rec["analysis"],
+        })
+    elif op == "end":
+        data["ended_at"] = rec.get("ended_at")
+        ended = True
+    return data, ended
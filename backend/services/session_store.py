@@ -2,82 +2,293 @@
 import os
 import json
 import uuid
+import atexit
 import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+
+from services.session_journal import (
+    JOURNAL_COMPACT_EVERY,
+    SEQ_KEY,
+    SessionJournal,
+    write_atomic,
+)
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 SESSIONS_DIR = os.path.join(DATA_DIR, "sessions")
 
+# "journal": append one record per event (default); "snapshot": rewrite the whole JSON per event
+SESSION_PERSISTENCE = os.getenv("SESSION_PERSISTENCE", "journal")
+# Sessions hash onto this many locks; unrelated sessions rarely contend
+SESSION_LOCK_STRIPES = int(os.getenv("SESSION_LOCK_STRIPES", "64"))
+# Working set kept in memory; least recently used sessions beyond it are evicted to disk
+SESSION_CACHE_MAX_SESSIONS = int(os.getenv("SESSION_CACHE_MAX_SESSIONS", "1000"))
+# Optional bound on the (approximate, serialized) size of the working set; 0 disables it
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", "0"))
+
 # Ensure folders exist
 os.makedirs(SESSIONS_DIR, exist_ok=True)
 
 class SessionStore:
     """
-    In-memory session store with optional on-disk JSON snapshots in data/sessions/{id}.json
+    Session store backed by on-disk JSON snapshots in data/sessions/{id}.json
     Structure:
     {
       session_id: {
         "created_at": ISO8601,
+        "ended_at": ISO8601 (only once ended),
         "chat_history": [ {"role":"user","text":"..."}, {"role":"bot","text":"..."} ],
         "image_history": [ {"filename":"...", "analysis": {...}} ]
       }
     }
+    In journal mode each event is also appended to data/sessions/{id}.journal
+    and the snapshot is only rewritten every JOURNAL_COMPACT_EVERY records
+    and when the session ends or is evicted.
+
+    Only a bounded working set is held in memory (`max_sessions`, and
+    optionally `max_bytes`). Least recently used sessions are evicted once
+    their state is on disk, and any access to an evicted or ended session
+    hydrates it from disk through `_resident()`. Ended sessions are served
+    read-only and are not cached.
+
+    Concurrency: each session hashes to one of `lock_stripes` locks, which
+    covers its mutation and the serialization of what must be persisted.
+    Disk writes happen after that lock is released; snapshots are written
+    via temp file + rename and never replaced by an older version.
     """
-    def __init__(self):
-        self._lock = threading.Lock()
-        self._sessions: Dict[str, Dict[str, Any]] = {}
+    SESSIONS_DIR = SESSIONS_DIR
+
+    def __init__(self, persistence: str = SESSION_PERSISTENCE, sessions_dir: str = SESSIONS_DIR,
+                 lock_stripes: int = SESSION_LOCK_STRIPES, max_sessions: int = SESSION_CACHE_MAX_SESSIONS,
+                 max_bytes: int = SESSION_CACHE_MAX_BYTES):
+        self.sessions_dir = sessions_dir
+        self.max_sessions = max(1, max_sessions)
+        self.max_bytes = max_bytes
+        os.makedirs(sessions_dir, exist_ok=True)
+        self._lock = threading.Lock()  # guards the dicts below, never held during I/O
+        self._stripes = [threading.Lock() for _ in range(max(1, lock_stripes))]
+        self._io_stripes = [threading.Lock() for _ in range(max(1, lock_stripes))]
+        # Resident sessions, least recently used first
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes: Dict[str, int] = {}    # approximate serialized size per resident session
+        self._total_bytes = 0
+        self._seq: Dict[str, int] = {}      # last journal seq / snapshot version per session
+        self._written: Dict[str, int] = {}  # snapshot mode: version currently on disk
+        self._inflight: Dict[str, int] = {} # snapshot mode: writes not yet on disk
+        self._unflushed: set = set()        # journal mode: evicted/ended, compaction maybe still queued
+        self._stats = {"hits": 0, "misses": 0, "hydrations": 0, "evictions": 0}
+        self._journal: Optional[SessionJournal] = None
+        if persistence == "journal":
+            self._journal = SessionJournal(sessions_dir)
+            atexit.register(self._journal.flush, 5.0)
 
     # ---- basic helpers ----
     def _path(self, session_id: str) -> str:
-        return os.path.join(SESSIONS_DIR, f"{session_id}.json")
+        return os.path.join(self.sessions_dir, f"{session_id}.json")
+
+    def _stripe(self, session_id: str) -> int:
+        return hash(session_id) % len(self._stripes)
+
+    def _lock_for(self, session_id: str) -> threading.Lock:
+        return self._stripes[self._stripe(session_id)]
+
+    @staticmethod
+    def _snapshot_json(data: Dict[str, Any], seq: int) -> str:
+        return json.dumps({**data, SEQ_KEY: seq}, indent=2, ensure_ascii=False)
+
+    def _grow(self, session_id: str, nbytes: int) -> None:
+        # self._lock held
+        self._bytes[session_id] = self._bytes.get(session_id, 0) + nbytes
+        self._total_bytes += nbytes
+
+    def _commit(self, session_id: str, data: Dict[str, Any], op: str,
+                **fields) -> Optional[Tuple[int, str]]:
+        """
+        Record one event; call with the session's stripe lock held.
+        Journal mode only enqueues. Snapshot mode returns (version, payload)
+        for _persist() to write once the lock is released.
+        """
+        seq = self._seq.get(session_id, 0) + 1
+        self._seq[session_id] = seq
+        if self._journal is None:
+            payload = json.dumps(data, indent=2, ensure_ascii=False)
+            self._inflight[session_id] = self._inflight.get(session_id, 0) + 1
+            with self._lock:
+                if session_id in self._sessions:
+                    self._grow(session_id, len(payload) - self._bytes.get(session_id, 0))
+            return seq, payload
+        self._journal.append(session_id, {"seq": seq, "op": op, **fields})
+        if self.max_bytes and op in ("chat", "image"):
+            with self._lock:
+                self._grow(session_id, len(json.dumps(fields, ensure_ascii=False)))
+        if seq % JOURNAL_COMPACT_EVERY == 0:
+            self._journal.compact(session_id, self._snapshot_json(data, seq))
+        return None
+
+    def _persist(self, session_id: str, pending: Optional[Tuple[int, str]]) -> None:
+        if pending is None:
+            return
+        version, payload = pending
+        try:
+            with self._io_stripes[self._stripe(session_id)]:
+                # A later event may already have written a newer snapshot
+                if self._written.get(session_id, 0) < version:
+                    write_atomic(self._path(session_id), payload)
+                    self._written[session_id] = version
+        finally:
+            with self._lock_for(session_id):
+                left = self._inflight.get(session_id, 1) - 1
+                if left:
+                    self._inflight[session_id] = left
+                else:
+                    self._inflight.pop(session_id, None)
+                    with self._lock:
+                        gone = session_id not in self._sessions
+                    if gone:
+                        # Ended: the watermark outlived every write that could have overtaken it
+                        self._written.pop(session_id, None)
+                        self._seq.pop(session_id, None)
+
+    # ---- working set ----
+    def _load(self, session_id: str) -> Tuple[Optional[Dict[str, Any]], int, bool]:
+        """Read one session from disk: (data or None, seq, ended)."""
+        if self._journal is not None:
+            with self._lock:
+                queued = session_id in self._unflushed
+                self._unflushed.discard(session_id)
+            if queued:
+                self._journal.flush()  # its eviction may still be waiting for the writer
+            data, seq, ended = self._journal.replay(session_id)
+            if data is not None and ended and os.path.exists(self._journal.journal_path(session_id)):
+                # Crashed before the final compaction finished
+                self._journal.compact(session_id, self._snapshot_json(data, seq), final=True)
+        else:
+            try:
+                with open(self._path(session_id), "r", encoding="utf-8") as fp:
+                    data = json.load(fp)
+            except (OSError, ValueError):
+                return None, 0, False
+            seq = 0
+            ended = False
+        if data is None:
+            return None, 0, False
+        data.pop(SEQ_KEY, None)
+        data.setdefault("chat_history", [])
+        data.setdefault("image_history", [])
+        return data, seq, ended or bool(data.get("ended_at"))
 
-    def _save_snapshot(self, session_id: str) -> None:
-        path = self._path(session_id)
+    def _resident(self, session_id: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        The single lookup path; call with the session's stripe lock held.
+        Returns (data, ended). Live sessions found on disk become resident.
+        """
         with self._lock:
             data = self._sessions.get(session_id)
-            if data is None:
+            if data is not None:
+                self._sessions.move_to_end(session_id)
+                self._stats["hits"] += 1
+                return data, False
+            self._stats["misses"] += 1
+        data, seq, ended = self._load(session_id)
+        if data is None or ended:
+            return data, ended
+        self._seq[session_id] = seq
+        size = len(json.dumps(data, ensure_ascii=False)) if self.max_bytes else 0
+        with self._lock:
+            self._sessions[session_id] = data
+            self._grow(session_id, size)
+            self._stats["hydrations"] += 1
+        return data, False
+
+    def _evict_overflow(self) -> None:
+        """Evict least recently used sessions until within bounds. Call with no locks held."""
+        skipped = set()
+        while True:
+            with self._lock:
+                over = len(self._sessions) > self.max_sessions or \
+                    (self.max_bytes and self._total_bytes > self.max_bytes and len(self._sessions) > 1)
+                victim = next((s for s in self._sessions if s not in skipped), None) if over else None
+            if victim is None:
                 return
-            with open(path, "w", encoding="utf-8") as fp:
-                json.dump(data, fp, indent=2, ensure_ascii=False)
+            if not self._evict(victim):
+                skipped.add(victim)
+
+    def _evict(self, session_id: str) -> bool:
+        with self._lock_for(session_id):
+            if self._inflight.get(session_id):
+                return False  # newest snapshot not on disk yet; try the next one
+            with self._lock:
+                data = self._sessions.pop(session_id, None)
+                if data is None:
+                    return True
+                self._total_bytes -= self._bytes.pop(session_id, 0)
+                self._stats["evictions"] += 1
+            seq = self._seq.pop(session_id, 0)
+            self._written.pop(session_id, None)
+            if self._journal is not None:
+                self._journal.compact(session_id, self._snapshot_json(data, seq))
+                with self._lock:
+                    self._unflushed.add(session_id)
+        return True
+
+    @staticmethod
+    def _new_session() -> Dict[str, Any]:
+        return {
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "chat_history": [],
+            "image_history": [],
+        }
 
     # ---- API ----
     def create_session(self) -> str:
-        session_id = str(uuid.uuid4())
-        with self._lock:
-            self._sessions[session_id] = {
-                "created_at": datetime.utcnow().isoformat() + "Z",
-                "chat_history": [],
-                "image_history": [],
-            }
-        self._save_snapshot(session_id)
-        return session_id
+        return self.create_session_with_id(str(uuid.uuid4()))
 
     def create_session_with_id(self, session_id: str) -> str:
         """
         Create a session using a specific session_id.
-        If session already exists, do nothing.
+        If a live session already exists (in memory or on disk), do nothing.
         """
-        with self._lock:
-            if session_id not in self._sessions:
-                self._sessions[session_id] = {
-                    "created_at": datetime.utcnow().isoformat() + "Z",
-                    "chat_history": [],
-                    "image_history": [],
-                }
-        self._save_snapshot(session_id)
+        pending = None
+        with self._lock_for(session_id):
+            data, ended = self._resident(session_id)
+            if data is not None and not ended:
+                return session_id
+            # New, or re-using the id of an ended session: start over
+            data = self._new_session()
+            with self._lock:
+                self._sessions[session_id] = data
+            pending = self._commit(session_id, data, "create", created_at=data["created_at"])
+        self._persist(session_id, pending)
+        self._evict_overflow()
         return session_id
 
     def exists(self, session_id: str) -> bool:
-        with self._lock:
-            return session_id in self._sessions
+        """True for live sessions, resident or not; ended sessions don't count."""
+        with self._lock_for(session_id):
+            data, ended = self._resident(session_id)
+        self._evict_overflow()
+        return data is not None and not ended
 
-    def add_chat(self, session_id: str, role: str, text: str) -> None:
-        with self._lock:
-            if session_id not in self._sessions:
+    def _mutate(self, session_id: str, op: str, key: str, entries: List[Dict[str, Any]]) -> None:
+        """Append entries as one atomic step: one journal record each, or a single snapshot write."""
+        pending = None
+        with self._lock_for(session_id):
+            data, ended = self._resident(session_id)
+            if data is None or ended:
                 raise KeyError("Invalid session_id")
-            # Normalize role to match OpenAI API requirements
+            data[key].extend(entries)
+            if self._journal is not None:
+                for entry in entries:
+                    self._commit(session_id, data, op, **entry)
+            elif entries:
+                pending = self._commit(session_id, data, op)
+        self._persist(session_id, pending)
+        self._evict_overflow()
+
+    def add_chat(self, session_id: str, role: str, text: str) -> None:
+        # Normalize role to match OpenAI API requirements
         role_map = {
             "bot": "assistant",
             "ai": "assistant",
@@ -85,36 +296,81 @@ class SessionStore:
         }
         normalized_role = role_map.get(role, role)  # fallback to same if already valid
 
-        self._sessions[session_id]["chat_history"].append({
+        self._mutate(session_id, "chat", "chat_history", [{
             "role": normalized_role,
             "text": text
-        })
+        }])
 
-        self._save_snapshot(session_id)
+    def add_image_analysis(self, session_id: str, filename: str, analysis: Dict[str, Any],
+                           image_path: Optional[str] = None) -> None:
+        """`image_path` is where the upload was stored; reports embed the image from there."""
+        self.add_image_analyses(session_id, [(filename, analysis, image_path)])
 
-    def add_image_analysis(self, session_id: str, filename: str, analysis: Dict[str, Any]) -> None:
-        with self._lock:
-            if session_id not in self._sessions:
-                raise KeyError("Invalid session_id")
-            self._sessions[session_id]["image_history"].append({
+    def add_image_analyses(self, session_id: str,
+                           items: List[Tuple[str, Dict[str, Any], Optional[str]]]) -> None:
+        """Record several (filename, analysis, image_path) results in one step."""
+        self._mutate(session_id, "image", "image_history", [
+            {
                 "filename": filename,
-                "image_path": os.path.abspath(filename),
+                "image_path": os.path.abspath(image_path or filename),
                 "analysis": analysis
-            })
-        self._save_snapshot(session_id)
+            }
+            for filename, analysis, image_path in items
+        ])
 
     def get_history(self, session_id: str) -> Dict[str, Any]:
-        with self._lock:
-            return self._sessions.get(session_id, {})
+        """
+        A consistent copy of a live or ended session ({} if unknown); later
+        appends don't show up in (or race with) the caller's lists.
+        """
+        with self._lock_for(session_id):
+            data, _ = self._resident(session_id)
+            if data is None:
+                return {}
+            data = {
+                **data,
+                "chat_history": list(data["chat_history"]),
+                "image_history": list(data["image_history"]),
+            }
+        self._evict_overflow()
+        return data
 
     def end_session(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Pop and return the final session content. Also keeps a final snapshot file."""
+        """Mark the session ended and drop it from memory; the final snapshot stays on disk."""
+        with self._lock_for(session_id):
+            data, ended = self._resident(session_id)
+            if data is None or ended:
+                return None
+            with self._lock:
+                self._sessions.pop(session_id, None)
+                self._total_bytes -= self._bytes.pop(session_id, 0)
+            data["ended_at"] = datetime.utcnow().isoformat() + "Z"
+            pending = None
+            if self._journal is not None:
+                seq = self._seq.pop(session_id, 0) + 1
+                self._journal.append(session_id, {"seq": seq, "op": "end", "ended_at": data["ended_at"]})
+                self._journal.compact(session_id, self._snapshot_json(data, seq), final=True)
+                with self._lock:
+                    self._unflushed.add(session_id)
+            else:
+                # _seq and _written stay until _persist() sees no writes in flight,
+                # so an older snapshot still on its way can't replace the final one
+                pending = self._commit(session_id, data, "end")
+        if self._journal is not None:
+            # Report generation reads the final snapshot right after this returns
+            self._journal.flush()
+        else:
+            self._persist(session_id, pending)
+        return data
+
+    def stats(self) -> Dict[str, Any]:
         with self._lock:
-            data = self._sessions.pop(session_id, None)
-        if data is None:
-            return None
-        # Keep a final, immutable snapshot on disk for later viewing
-        final_path = self._path(session_id)
-        with open(final_path, "w", encoding="utf-8") as fp:
-            json.dump(data, fp, indent=2, ensure_ascii=False)
-        return data
\ No newline at end of file
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "resident": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "resident_bytes": self._total_bytes if self.max_bytes else None,
+                "max_bytes": self.max_bytes or None,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
@@ -1,92 +1,400 @@
-import json 
-import os 
-from datetime import datetime 
-from typing import Any, Dict, List 
-BASE_DIR = os.path.dirname(os.path.dirname(__file__)) 
-DATA_DIR = os.path.join(BASE_DIR, "data") 
-UPLOAD_DIR = os.path.join(BASE_DIR, "uploaded_images") 
-REPORT_DIR = os.path.join(DATA_DIR, "reports") 
-HISTORY_FILE = os.path.join(DATA_DIR, "history.json") 
-IMAGES_FILE = os.path.join(DATA_DIR, "images.json") 
-REPORTS_FILE = os.path.join(DATA_DIR, "reports.json") 
-def ensure_dirs(): 
-    os.makedirs(DATA_DIR, exist_ok=True) 
-    os.makedirs(UPLOAD_DIR, exist_ok=True) 
-    os.makedirs(REPORT_DIR, exist_ok=True) 
-    for f in [HISTORY_FILE, IMAGES_FILE, REPORTS_FILE]: 
-        if not os.path.exists(f): 
-            with open(f, "w", encoding="utf-8") as fp: 
-                json.dump([], fp) 
-# --- Base JSON helpers --- 
-def _load(path: str) -> List[Dict[str, Any]]: 
-    with open(path, "r", encoding="utf-8") as fp: 
-        return json.load(fp) 
-def _save(path: str, data: List[Dict[str, Any]]) -> None: 
-    with open(path, "w", encoding="utf-8") as fp: 
-        json.dump(data, fp, indent=2, ensure_ascii=False) 
-
-
-# --- Safer JSON helpers (with default) --- 
-
-def _load_json(path: str, default): 
-    if not os.path.exists(path): 
-        return default 
-    try: 
-        with open(path, "r", encoding="utf-8") as fp: return json.load(fp) 
-    
-    except Exception: 
-        return default 
-def _save_json(path: str, data): 
-    with open(path, "w", encoding="utf-8") as fp: 
-        json.dump(data, fp, indent=2, ensure_ascii=False) 
-        
-# --- Chat history --- 
-
-def add_chat(question: str, answer: str, matched: str, score: float) -> Dict[str, Any]: 
-    hist = _load(HISTORY_FILE) 
-    item = { 
-            "id": f"chat_{len(hist)+1}", "ts": datetime.utcnow().isoformat() + "Z", "question": question, "answer": answer, "matched_question": matched, "score": score } 
-    hist.append(item) 
-    _save(HISTORY_FILE, hist) 
-    return item 
-
-def get_history(n: int = 50) -> List[Dict[str, Any]]: 
-    hist = _load(HISTORY_FILE) 
-    return hist[-n:] 
-
-# --- Images --- 
-
-
-def register_image(filename: str, path: str) -> Dict[str, Any]: 
-    imgs = _load(IMAGES_FILE) 
-    item = { 
-            "id": f"img_{len(imgs)+1}", "filename": filename, "path": path, "ts": datetime.utcnow().isoformat() + "Z" } 
-    imgs.append(item) 
-    _save(IMAGES_FILE, imgs) 
-    return item 
-
-def get_image(image_id: str) -> Dict[str, Any]: 
-    imgs = _load(IMAGES_FILE) 
-    for i in imgs: 
-        if i["id"] == image_id: 
-            return i 
-    raise KeyError("image not found") 
-
-# --- Reports --- 
-
-
-def register_report(filename: str) -> Dict[str, Any]: 
-    reports = _load_json(REPORTS_FILE, []) 
-    new_id = f"rep_{len(reports)+1}" 
-    # prevent duplicates 
-    for r in reports: 
-        if r["filename"] == filename: 
-            return r 
-    entry = { 
-             "id": new_id, "filename": filename, "path": os.path.join(REPORT_DIR, filename), "ts": datetime.utcnow().isoformat() + "Z", } 
-    reports.append(entry) 
-    _save_json(REPORTS_FILE, reports) 
-    return entry 
-
-def list_reports() -> List[Dict[str, Any]]: 
-    return _load_json(REPORTS_FILE, [])
\ No newline at end of file
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+UPLOAD_DIR = os.path.join(BASE_DIR, "uploaded_images")
+REPORT_DIR = os.path.join(DATA_DIR, "reports")
+HISTORY_FILE = os.path.join(DATA_DIR, "history.json")
+IMAGES_FILE = os.path.join(DATA_DIR, "images.json")
+REPORTS_FILE = os.path.join(DATA_DIR, "reports.json")
+
+# "sqlite" (default) or "json" (the original whole-file registries)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+STORAGE_DB_PATH = os.getenv("STORAGE_DB_PATH", os.path.join(DATA_DIR, "registry.db"))
+
+def ensure_dirs():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    if STORAGE_BACKEND != "json":
+        return
+    for f in [HISTORY_FILE, IMAGES_FILE, REPORTS_FILE]:
+        if not os.path.exists(f):
+            with open(f, "w", encoding="utf-8") as fp:
+                json.dump([], fp)
+# --- Base JSON helpers ---
+def _load(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as fp:
+        return json.load(fp)
+def _save(path: str, data: List[Dict[str, Any]]) -> None:
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(data, fp, indent=2, ensure_ascii=False)
+
+
+# --- Safer JSON helpers (with default) ---
+
+def _load_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r", encoding="utf-8") as fp: return json.load(fp)
+
+    except Exception:
+        return default
+def _save_json(path: str, data):
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(data, fp, indent=2, ensure_ascii=False)
+
+def _now() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+def _in_range(ts: str, since: Optional[str], until: Optional[str]) -> bool:
+    """ISO timestamps compare as strings; `since` is inclusive, `until` exclusive."""
+    return (since is None or ts >= since) and (until is None or ts < until)
+
+def _page(items: List[Dict[str, Any]], limit: Optional[int], offset: int) -> List[Dict[str, Any]]:
+    return items[offset:] if limit is None else items[offset:offset + limit]
+
+
+# --- Backends ---
+
+class JsonStorage:
+    """The original registries: every write loads and rewrites the whole JSON file."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    # chat history
+    def add_chat(self, question: str, answer: str, matched: str, score: float) -> Dict[str, Any]:
+        with self._lock:
+            hist = _load(HISTORY_FILE)
+            item = {
+                    "id": f"chat_{len(hist)+1}", "ts": _now(), "question": question, "answer": answer, "matched_question": matched, "score": score }
+            hist.append(item)
+            _save(HISTORY_FILE, hist)
+        return item
+
+    def get_history(self, n: int = 50) -> List[Dict[str, Any]]:
+        hist = _load(HISTORY_FILE)
+        return hist[-n:]
+
+    # images
+    def register_images(self, items: Iterable[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        with self._lock:
+            imgs = _load(IMAGES_FILE)
+            added = []
+            for filename, path in items:
+                item = {
+                        "id": f"img_{len(imgs)+1}", "filename": filename, "path": path, "ts": _now() }
+                imgs.append(item)
+                added.append(item)
+            _save(IMAGES_FILE, imgs)
+        return added
+
+    def get_image(self, image_id: str) -> Dict[str, Any]:
+        imgs = _load(IMAGES_FILE)
+        for i in imgs:
+            if i["id"] == image_id:
+                return i
+        raise KeyError("image not found")
+
+    def list_images(self, limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        return _page(_load(IMAGES_FILE), limit, offset)
+
+    # reports
+    def register_report(self, filename: str) -> Dict[str, Any]:
+        with self._lock:
+            reports = _load_json(REPORTS_FILE, [])
+            new_id = f"rep_{len(reports)+1}"
+            # prevent duplicates
+            for r in reports:
+                if r["filename"] == filename:
+                    return r
+            entry = {
+                     "id": new_id, "filename": filename, "path": os.path.join(REPORT_DIR, filename), "ts": _now(), }
+            reports.append(entry)
+            _save_json(REPORTS_FILE, reports)
+        return entry
+
+    def get_report(self, report_id: str) -> Dict[str, Any]:
+        for r in _load_json(REPORTS_FILE, []):
+            if r["id"] == report_id:
+                return r
+        raise KeyError("report not found")
+
+    def list_reports(self, limit: Optional[int] = None, offset: int = 0,
+                     since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        reports = [r for r in _load_json(REPORTS_FILE, []) if _in_range(r.get("ts") or "", since, until)]
+        return _page(reports, limit, offset)
+
+    def get_reports(self, report_ids: List[str]) -> List[Dict[str, Any]]:
+        wanted = set(report_ids)
+        return [r for r in _load_json(REPORTS_FILE, []) if r["id"] in wanted]
+
+
+class SqliteStorage:
+    """
+    Registries in one embedded SQLite database (WAL mode).
+
+    IDs keep the JSON format (chat_N / img_N / rep_N); N comes from an
+    autoincrement sequence instead of len(list)+1. Lookups by id and report
+    filename are indexed, inserts append one row, and listings are paged
+    in SQL. WAL lets readers (and report worker processes) proceed while
+    one writer commits.
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS history ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, ts TEXT NOT NULL,"
+        " question TEXT, answer TEXT, matched_question TEXT, score REAL)",
+        "CREATE TABLE IF NOT EXISTS images ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE,"
+        " filename TEXT, path TEXT, ts TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS reports ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE,"
+        " filename TEXT NOT NULL UNIQUE, path TEXT, ts TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS reports_ts ON reports(ts)",
+    )
+    _PREFIX = {"history": "chat", "images": "img", "reports": "rep"}
+    _COLUMNS = {
+        "history": ("id", "ts", "question", "answer", "matched_question", "score"),
+        "images": ("id", "filename", "path", "ts"),
+        "reports": ("id", "filename", "path", "ts"),
+    }
+
+    def __init__(self, path: str = STORAGE_DB_PATH, auto_import: bool = True):
+        self.path = path
+        fresh = auto_import and not os.path.exists(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for stmt in self._SCHEMA:
+            self._db.execute(stmt)
+        if fresh:
+            # One-shot import of the JSON registries the first time the DB is created
+            counts = self.import_json()
+            if any(counts.values()):
+                print("Imported JSON registries into", path, counts)
+
+    # ---- helpers (rows are dicts shaped like the JSON entries) ----
+    def _select(self, table: str, where: str = "", params: tuple = (), tail: str = "") -> List[Dict[str, Any]]:
+        cols = ", ".join(self._COLUMNS[table])
+        sql = f"SELECT {cols} FROM {table} {where} {tail}"
+        with self._lock:
+            return [dict(r) for r in self._db.execute(sql, params).fetchall()]
+
+    def _insert(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert new rows in one transaction, assigning consecutive ids."""
+        if not rows:
+            return []
+        cols = [c for c in self._COLUMNS[table] if c != "id"]
+        sql = (f"INSERT INTO {table} (seq, id, {', '.join(cols)})"
+               f" VALUES (?, ?, {', '.join('?' * len(cols))})")
+        prefix = self._PREFIX[table]
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so no other process
+            # can claim the same sequence numbers between the read and insert
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                start = self._db.execute(
+                    "SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)
+                ).fetchone()
+                start = start[0] if start else 0
+                for i, row in enumerate(rows, start + 1):
+                    row["id"] = f"{prefix}_{i}"
+                self._db.executemany(
+                    sql, [(i, row["id"], *(row[c] for c in cols)) for i, row in enumerate(rows, start + 1)]
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return [{c: row[c] for c in self._COLUMNS[table]} for row in rows]
+
+    # ---- chat history ----
+    def add_chat(self, question: str, answer: str, matched: str, score: float) -> Dict[str, Any]:
+        return self._insert("history", [{
+            "ts": _now(), "question": question, "answer": answer,
+            "matched_question": matched, "score": score,
+        }])[0]
+
+    def get_history(self, n: int = 50) -> List[Dict[str, Any]]:
+        rows = self._select("history", tail="ORDER BY seq DESC LIMIT ?", params=(n,))
+        return rows[::-1]
+
+    # ---- images ----
+    def register_images(self, items: Iterable[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        ts = _now()
+        return self._insert("images", [{"filename": f, "path": p, "ts": ts} for f, p in items])
+
+    def get_image(self, image_id: str) -> Dict[str, Any]:
+        rows = self._select("images", "WHERE id = ?", (image_id,))
+        if not rows:
+            raise KeyError("image not found")
+        return rows[0]
+
+    def list_images(self, limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        return self._select("images", tail="ORDER BY seq LIMIT ? OFFSET ?",
+                            params=(-1 if limit is None else limit, offset))
+
+    # ---- reports ----
+    def register_report(self, filename: str) -> Dict[str, Any]:
+        # prevent duplicates
+        rows = self._select("reports", "WHERE filename = ?", (filename,))
+        if rows:
+            return rows[0]
+        try:
+            return self._insert("reports", [{
+                "filename": filename, "path": os.path.join(REPORT_DIR, filename), "ts": _now(),
+            }])[0]
+        except sqlite3.IntegrityError:
+            # Registered concurrently by another worker
+            return self._select("reports", "WHERE filename = ?", (filename,))[0]
+
+    def get_report(self, report_id: str) -> Dict[str, Any]:
+        rows = self._select("reports", "WHERE id = ?", (report_id,))
+        if not rows:
+            raise KeyError("report not found")
+        return rows[0]
+
+    def list_reports(self, limit: Optional[int] = None, offset: int = 0,
+                     since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        where, params = [], []
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("ts < ?")
+            params.append(until)
+        return self._select("reports", "WHERE " + " AND ".join(where) if where else "",
+                            tail="ORDER BY seq LIMIT ? OFFSET ?",
+                            params=(*params, -1 if limit is None else limit, offset))
+
+    def get_reports(self, report_ids: List[str]) -> List[Dict[str, Any]]:
+        marks = ", ".join("?" * len(report_ids))
+        return self._select("reports", f"WHERE id IN ({marks})", tuple(report_ids), tail="ORDER BY seq")
+
+    # ---- migration ----
+    def import_json(self) -> Dict[str, int]:
+        """
+        Copy history.json / images.json / reports.json in, keeping their ids.
+        Safe to re-run: ids (and report filenames) already present are skipped.
+        """
+        counts = {}
+        for table, path in (("history", HISTORY_FILE), ("images", IMAGES_FILE), ("reports", REPORTS_FILE)):
+            items = _load_json(path, [])
+            cols = self._COLUMNS[table]
+            rows = []
+            for item in items:
+                if not isinstance(item, dict) or "id" not in item:
+                    continue
+                suffix = str(item["id"]).rsplit("_", 1)[-1]
+                seq = int(suffix) if suffix.isdigit() else None
+                rows.append((seq, *(item.get(c) if c != "ts" else item.get(c) or _now() for c in cols)))
+            sql = (f"INSERT OR IGNORE INTO {table} (seq, {', '.join(cols)})"
+                   f" VALUES (?, {', '.join('?' * len(cols))})")
+            with self._lock:
+                before = self._db.total_changes
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    self._db.executemany(sql, rows)
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+                counts[table] = self._db.total_changes - before
+        return counts
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """The configured backend (STORAGE_BACKEND), created on first use."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                ensure_dirs()
+                _storage = JsonStorage() if STORAGE_BACKEND == "json" else SqliteStorage()
+    return _storage
+
+# --- Chat history ---
+
+def add_chat(question: str, answer: str, matched: str, score: float) -> Dict[str, Any]:
+    return get_storage().add_chat(question, answer, matched, score)
+
+def get_history(n: int = 50) -> List[Dict[str, Any]]:
+    return get_storage().get_history(n)
+
+# --- Images ---
+
+
+def register_image(filename: str, path: str) -> Dict[str, Any]:
+    return get_storage().register_images([(filename, path)])[0]
+
+def register_images(items: Iterable[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Register several (filename, path) pairs with a single write."""
+    return get_storage().register_images(items)
+
+def get_image(image_id: str) -> Dict[str, Any]:
+    return get_storage().get_image(image_id)
+
+def iter_images(page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """Every registered image, oldest first, a page at a time."""
+    backend = get_storage()
+    offset = 0
+    while True:
+        page = backend.list_images(page_size, offset)
+        yield from page
+        if len(page) < page_size:
+            return
+        offset += page_size
+
+# --- Reports ---
+
+
+def register_report(filename: str) -> Dict[str, Any]:
+    return get_storage().register_report(filename)
+
+def get_report(report_id: str) -> Dict[str, Any]:
+    return get_storage().get_report(report_id)
+
+def list_reports(limit: Optional[int] = None, offset: int = 0,
+                 since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+    return get_storage().list_reports(limit, offset, since, until)
+
+def iter_reports(report_ids: Optional[List[str]] = None, since: Optional[str] = None,
+                 until: Optional[str] = None, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+    """Yield matching reports a page at a time, so exports never hold the whole registry."""
+    backend = get_storage()
+    if report_ids is not None:
+        for i in range(0, len(report_ids), page_size):
+            yield from backend.get_reports(report_ids[i:i + page_size])
+        return
+    offset = 0
+    while True:
+        page = backend.list_reports(page_size, offset, since, until)
+        yield from page
+        if len(page) < page_size:
+            return
+        offset += page_size
+
+
+if __name__ == "__main__":
+    # python -m services.storage migrate [--db path]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Registry storage tools")
+    parser.add_argument("command", choices=["migrate"], help="import the JSON registries into SQLite")
+    parser.add_argument("--db", default=STORAGE_DB_PATH)
+    args = parser.parse_args()
+    ensure_dirs()
+    counts = SqliteStorage(args.db, auto_import=False).import_json()
+    print(json.dumps({"db": args.db, "imported": counts}))
@@ -0,0 +1,141 @@
+# services/upload_service.py
+import os
+import uuid
+import hashlib
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from services.storage import UPLOAD_DIR
+
+# Largest accepted image; anything bigger is rejected while streaming
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(256 * 1024)))
+# Photos accepted by one batch upload request
+MAX_BATCH_IMAGES = int(os.getenv("MAX_BATCH_IMAGES", "20"))
+
+# Accepted formats, recognised by magic bytes only: (extension, name, test on the leading bytes)
+_FORMATS = [
+    (".jpg", "JPEG", lambda head: head.startswith(b"\xff\xd8\xff")),
+    (".png", "PNG", lambda head: head.startswith(b"\x89PNG\r\n\x1a\n")),
+    (".gif", "GIF", lambda head: head[:6] in (b"GIF87a", b"GIF89a")),
+    (".webp", "WebP", lambda head: head[:4] == b"RIFF" and head[8:12] == b"WEBP"),
+    (".bmp", "BMP", lambda head: head.startswith(b"BM")),
+    (".tiff", "TIFF", lambda head: head[:4] in (b"II*\x00", b"MM\x00*")),
+]
+# Enough leading bytes to recognise every format above
+_SNIFF_BYTES = 12
+_NAMES = [name for _, name, _ in _FORMATS]
+_UNSUPPORTED = f"Unsupported file type; please upload a {', '.join(_NAMES[:-1])} or {_NAMES[-1]} photo"
+
+
+class UploadRejected(ValueError):
+    """Upload refused before analysis; `status_code` maps straight to the HTTP response."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """File extension for a supported image format, judged by magic bytes only."""
+    for ext, _, matches in _FORMATS:
+        if matches(head):
+            return ext
+    return None
+
+
+@dataclass
+class SpooledUpload:
+    """An upload on disk under a temporary name until commit() or discard()."""
+    original_name: str
+    temp_path: str
+    ext: str
+    digest: str
+    size: int
+    path: Optional[str] = None
+
+    @property
+    def filename(self) -> Optional[str]:
+        return os.path.basename(self.path) if self.path else None
+
+    def read_bytes(self) -> bytes:
+        with open(self.path or self.temp_path, "rb") as fp:
+            return fp.read()
+
+    def commit(self, dest_dir: str = UPLOAD_DIR) -> str:
+        """Atomically move into place under a unique name; returns the final path."""
+        if self.path is None:
+            final = os.path.join(dest_dir, f"{uuid.uuid4().hex}{self.ext}")
+            os.replace(self.temp_path, final)
+            self.path = final
+        return self.path
+
+    def discard(self) -> None:
+        if self.path is None and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+def _open_spool(dest_dir: str):
+    # Same directory as the final file, so commit() is a rename, never a copy
+    os.makedirs(dest_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=dest_dir, prefix=".upload-", suffix=".part")
+    return os.fdopen(fd, "wb"), path
+
+
+async def spool_upload(file, dest_dir: str = UPLOAD_DIR, max_bytes: int = MAX_UPLOAD_BYTES,
+                       chunk_size: int = UPLOAD_CHUNK_BYTES) -> SpooledUpload:
+    """
+    Read an UploadFile in chunks into a temp file next to `dest_dir`,
+    hashing as it goes. Raises UploadRejected (415) as soon as the leading
+    bytes aren't a known image format and (413) once `max_bytes` is
+    exceeded; at most one chunk is held in memory.
+    """
+    declared = getattr(file, "size", None)
+    if declared is not None and declared > max_bytes:
+        raise UploadRejected(413, f"Image is larger than {max_bytes // (1024 * 1024)} MB")
+
+    fp, temp_path = await run_in_threadpool(_open_spool, dest_dir)
+    sha = hashlib.sha256()
+    size = 0
+    head = b""
+    ext = None
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadRejected(413, f"Image is larger than {max_bytes // (1024 * 1024)} MB")
+            if ext is None:
+                head += chunk[:_SNIFF_BYTES]
+                if len(head) >= _SNIFF_BYTES:
+                    ext = sniff_image_type(head)
+                    if ext is None:
+                        raise UploadRejected(415, _UNSUPPORTED)
+            sha.update(chunk)
+            await run_in_threadpool(fp.write, chunk)
+        if ext is None:
+            # Shorter than the sniff window
+            if not head:
+                raise UploadRejected(400, "Empty upload")
+            ext = sniff_image_type(head)
+            if ext is None:
+                raise UploadRejected(415, _UNSUPPORTED)
+        await run_in_threadpool(fp.close)
+    except BaseException:
+        fp.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return SpooledUpload(
+        original_name=file.filename or "",
+        temp_path=temp_path,
+        ext=ext,
+        digest=sha.hexdigest(),
+        size=size,
+    )
@@ -0,0 +1,33 @@
+import json
+import os
+
+import numpy as np
+
+from services.faq_index import FaqIndex
+
+
+def _encode(texts):
+    # One-hot-ish vectors keyed by text length: enough to tell entries apart
+    vecs = np.zeros((len(texts), 8), dtype=np.float32)
+    for i, t in enumerate(texts):
+        vecs[i, len(t) % 8] = 1.0
+    return vecs
+
+
+def test_half_written_faq_keeps_current_index(tmp_path):
+    path = tmp_path / "faq.json"
+    path.write_text(json.dumps({"a": "1"}), encoding="utf-8")
+    index = FaqIndex(_encode, path=str(path), reload_interval=0)
+    assert len(index) == 1
+    mtime = index._mtime
+
+    path.write_text('{"a": "1", ', encoding="utf-8")  # truncated mid-write
+    os.utime(path, (mtime + 5, mtime + 5))
+    query = _encode(["a"])[0]
+    assert index.search(query) == [("a", "1", 1.0)]
+    assert index._mtime == mtime
+
+    path.write_text(json.dumps({"a": "1", "bb": "2"}), encoding="utf-8")
+    os.utime(path, (mtime + 10, mtime + 10))
+    index.search(query)
+    assert len(index) == 2
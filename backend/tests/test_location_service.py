@@ -0,0 +1,32 @@
+from services import location_service
+from services.location_service import LocationContextProvider, WeatherBackend
+
+
+class FlakyBackend(WeatherBackend):
+    def __init__(self):
+        self.fail = False
+
+    def fetch(self, location):
+        if self.fail:
+            raise ConnectionError("weather API down")
+        return {"temp": 21.5}
+
+
+def test_failed_refresh_keeps_serving_stale_value(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(location_service.time, "monotonic", lambda: clock[0])
+    backend = FlakyBackend()
+    provider = LocationContextProvider(backend, ttl=10, stale_ttl=100, negative_ttl=50)
+
+    assert provider.get_weather("Pune") == {"temp": 21.5}
+
+    backend.fail = True
+    clock[0] += 20  # stale, still inside stale_ttl
+    assert provider.get_weather("Pune") == {"temp": 21.5}
+    for future in list(provider._inflight.values()):
+        future.result(timeout=5)  # let the failing refresh finish
+
+    assert provider.get_weather("Pune") == {"temp": 21.5}
+    stats = provider.stats()
+    assert stats["errors"] >= 1
+    assert stats["negative_hits"] == 0
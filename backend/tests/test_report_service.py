@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from services import report_service
+
+
+@pytest.fixture
+def report_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_service, "REPORT_DIR", str(tmp_path / "reports"))
+    monkeypatch.setattr(report_service, "REPORT_META_DIR", str(tmp_path / "meta"))
+    monkeypatch.setattr(report_service, "REPORT_IMAGE_DIR", str(tmp_path / "images"))
+    os.makedirs(tmp_path / "reports")
+    return tmp_path
+
+
+def _session(*texts):
+    return {"chat_history": [{"role": "user", "text": t} for t in texts], "image_history": []}
+
+
+def test_changed_session_never_gets_the_old_pdf(report_dirs):
+    data = _session("How often should I walk my beagle?")
+    old_fp = report_service.session_fingerprint(data)
+    old_pdf = report_service.create_session_report_pdf("s1", data, old_fp)
+    assert report_service.cached_report("s1", old_fp) == old_pdf
+
+    data = _session("How often should I walk my beagle?", "And my pug?")
+    new_fp = report_service.session_fingerprint(data)
+    assert new_fp != old_fp
+    assert report_service.cached_report("s1", new_fp) is None
+
+    new_pdf = report_service.create_session_report_pdf("s1", data, new_fp)
+    assert os.path.basename(new_pdf) != os.path.basename(old_pdf)
+    assert report_service.cached_report("s1", new_fp) == new_pdf
+    assert report_service.cached_report("s1", old_fp) is None
+    assert not os.path.exists(old_pdf)
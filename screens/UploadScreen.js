@@ -7,6 +7,18 @@ import AsyncStorage from "@react-native-async-storage/async-storage";
 const API_URL = "http://192.168.29.117:8000";
 const SESSION_KEY = "dog_ai_session_id";
 
+// Reports render in the background: poll status_url until the job is done
+const waitForReport = async (report, attempts = 60) => {
+  let job = report;
+  for (let i = 0; job.status !== "done"; i++) {
+    if (job.status === "failed") throw new Error(job.error || "Report generation failed");
+    if (!job.status_url || i >= attempts) throw new Error("Report is not ready yet, please try again");
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+    job = (await axios.get(`${API_URL}${job.status_url}`)).data;
+  }
+  return job.report_url;
+};
+
 export default function UploadScreen({ route }) {
   const initialSessionId = route.params?.sessionId || null;
   const [sessionId, setSessionId] = useState(initialSessionId);
@@ -87,8 +99,9 @@ export default function UploadScreen({ route }) {
     if (!sessionId) return;
     try {
       const res = await axios.get(`${API_URL}/session/${sessionId}/report`);
+      const reportUrl = await waitForReport(res.data);
       // Append timestamp to force fresh download
-      const url = `${API_URL}${res.data.report_url}?t=${Date.now()}`;
+      const url = `${API_URL}${reportUrl}?t=${Date.now()}`;
       Linking.openURL(url);
     } catch (err) {
       console.log(err?.response?.data || err.message);